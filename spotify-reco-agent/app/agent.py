@@ -5,7 +5,9 @@ from collections import defaultdict
 from dotenv import load_dotenv
 from llama_index.llms.ollama import Ollama
 
+from .genres import BLOCKED, CALM, NOISY, SEARCH_FAMILIES, track_mask
 from .neo4j_search import search_similar_tracks
+from .tracing import span, traced_request
 
 # Detección de idioma
 from langdetect import detect, DetectorFactory, LangDetectException
@@ -49,13 +51,8 @@ GENRE_KEYWORDS = {
     "hip-hop": "hip hop",
     "rap": "rap",
 }
-
-BLOCK_GENRES_DEFAULT = {
-    "korean", "japanese", "turkish", "arabic",
-    "cantopop", "indian", "thai", "russian",
-    "brazilian", "latin jazz", "anime", "j-pop",
-    "gaming", "world", "afrobeats"
-}
+# cada palabra clave debe llevar a una familia buscable de app/genres.py
+assert set(GENRE_KEYWORDS.values()) == set(SEARCH_FAMILIES), "GENRE_KEYWORDS no coincide con SEARCH_FAMILIES"
 
 
 RELAX_WORDS = {"relajar", "relajado", "relajada", "tranquila", "tranquilo", "calma", "chill", "suave", "descansar"}
@@ -185,8 +182,7 @@ def filter_by_language_and_genre(user_query: str, tracks: list[dict]) -> list[di
         if not mostly_latin(combined):
             continue
 
-        genres = [g.lower() for g in (t.get("genres") or [])]
-        if any(bg in genres for bg in BLOCK_GENRES_DEFAULT):
+        if track_mask(t) & BLOCKED:
             continue
 
         if not passes_language_filter(user_query, title, artist):
@@ -202,18 +198,15 @@ def calm_score(track: dict, user_query: str) -> float:
     Score simple: mayor => más “tranquilo”.
     Usa género y popularidad como señales.
     """
-    genres = [g.lower() for g in (track.get("genres") or [])]
+    mask = track_mask(track)
     pop = track.get("popularity") or 0
 
     score = 0.0
 
-    # géneros típicos de calma
-    calm_genres = {"lofi", "ambient", "acoustic", "chill", "study", "piano", "classical", "soul"}
-    noisy_genres = {"gaming", "hardstyle", "edm", "metal", "techno", "drum and bass"}
-
-    if any(g in calm_genres for g in genres):
+    # géneros típicos de calma / ruidosos (familias de app/genres.py)
+    if mask & CALM:
         score += 3.0
-    if any(g in noisy_genres for g in genres):
+    if mask & NOISY:
         score -= 3.0
 
     # si el usuario pide relax, favorecemos temas no “mega mainstream”
@@ -326,31 +319,28 @@ def sanitize_explanation(text: str, results: list[dict]) -> str:
     return out
 
 # ======================================================
-# FUNCIÓN PRINCIPAL
+# Pasos del pipeline (compartidos con app/service.py)
 # ======================================================
-def chat_with_agent(user_query: str, k: int | None = None) -> str:
-    cleaned = user_query.strip()
-
-    if len(cleaned) < 4:
-        return (
-            "😊 Cuéntame un poco más: un género, "
-            "un estado de ánimo o algún artista que te guste."
-        )
+SHORT_QUERY_REPLY = (
+    "😊 Cuéntame un poco más: un género, "
+    "un estado de ánimo o algún artista que te guste."
+)
+NO_RESULTS_REPLY = "No he encontrado canciones que encajen con lo que pides 😔."
 
-    k_effective = k if k is not None else parse_num_songs_from_query(cleaned)
-    genre = detect_genre(cleaned)
 
-    raw = search_similar_tracks(
-        cleaned,
-        k=max(k_effective * 8, 50),
-        genre_filter=genre,
-    )
+def search_k(k_effective: int) -> int:
+    # Pedimos de más porque los filtros descartan bastantes candidatos
+    return max(k_effective * 8, 50)
 
-    if not raw:
-        return "No he encontrado canciones que encajen con lo que pides 😔."
 
+def rank_candidates(cleaned: str, raw: list[dict], k_effective: int) -> list[dict]:
+    """
+    Filtra, reordena y diversifica los candidatos de la búsqueda vectorial.
+    """
     # ✅ 1) FILTRAR primero (y SIEMPRE definir filtered)
-    filtered = filter_by_language_and_genre(cleaned, raw)
+    with span("filter", candidates=len(raw)) as sp:
+        filtered = filter_by_language_and_genre(cleaned, raw)
+        sp.set(kept=len(filtered))
 
     # ✅ 2) Si el filtro es demasiado estricto, usar raw
     if not filtered:
@@ -358,33 +348,33 @@ def chat_with_agent(user_query: str, k: int | None = None) -> str:
 
     # ✅ 3) Reordenar SOLO después de existir filtered
     if wants_relax(cleaned) or wants_study(cleaned):
-        filtered = sorted(
-            filtered,
-            key=lambda t: calm_score(t, cleaned),
-            reverse=True
-        )
+        with span("rerank", candidates=len(filtered)):
+            filtered = sorted(
+                filtered,
+                key=lambda t: calm_score(t, cleaned),
+                reverse=True
+            )
 
     # ✅ 4) Limitar por artista
-    candidates = limit_tracks_per_artist(filtered, max_per_artist=2)
-    if len(candidates) < k_effective:
-        candidates = limit_tracks_per_artist(filtered, max_per_artist=3)
+    with span("diversify"):
+        candidates = limit_tracks_per_artist(filtered, max_per_artist=2)
+        if len(candidates) < k_effective:
+            candidates = limit_tracks_per_artist(filtered, max_per_artist=3)
 
-    results = candidates[:k_effective]
-    if not results:
-        return "No he encontrado canciones que encajen con lo que pides 😔."
+    return candidates[:k_effective]
 
-    # Lista final
+
+def format_track_list(results: list[dict]) -> str:
     lines = []
     for i, r in enumerate(results, start=1):
         genres = ", ".join(r.get("genres") or []) or "sin género"
         pop = r.get("popularity")
         pop_txt = f", popularidad {pop}" if pop is not None else ""
         lines.append(f"{i}. {r['title']} – {r['artist']} ({genres}{pop_txt})")
-    lista = "\n".join(lines)
+    return "\n".join(lines)
 
-    # Explicación (fallback seguro)
-    explanation = safe_explanation(cleaned, results)
 
+def build_explanation_prompt(cleaned: str, results: list[dict]) -> str:
     # Contexto real para el LLM (sin títulos/artistas)
     genres_set = []
     for r in results:
@@ -397,7 +387,7 @@ def chat_with_agent(user_query: str, k: int | None = None) -> str:
     pop_avg = round(sum(pops) / len(pops)) if pops else None
     pop_txt = f"popularidad media ~{pop_avg}" if pop_avg is not None else "popularidad variada"
 
-    explanation_prompt = f"""
+    return f"""
 Petición del usuario: "{cleaned}"
 
 Contexto real de la selección:
@@ -421,16 +411,82 @@ FORMATO:
 Devuelve SOLO el texto.
 """.strip()
 
-    # Intento con LLM
-    try:
-        r = llm.complete(explanation_prompt)
-        candidate = getattr(r, "text", str(r)).strip().strip('"').strip()
+
+def finish_answer(cleaned: str, results: list[dict], llm_response=None) -> str:
+    """
+    Usa la respuesta del LLM si pasa los controles (si no, la explicación
+    segura) y compone la respuesta final.
+    """
+    # Explicación (fallback seguro)
+    explanation = safe_explanation(cleaned, results)
+
+    if llm_response is not None:
+        candidate = getattr(llm_response, "text", str(llm_response)).strip().strip('"').strip()
         if candidate and not explanation_looks_hallucinated(candidate):
             explanation = candidate
-    except Exception:
-        pass
 
     # Limpieza final
     explanation = sanitize_explanation(explanation, results)
 
-    return f"{lista}\n\nExplicación:\n{explanation}"
+    return f"{format_track_list(results)}\n\nExplicación:\n{explanation}"
+
+
+# ======================================================
+# FUNCIÓN PRINCIPAL
+# ======================================================
+# Respuestas precalculadas por app/warmup.py: (consulta normalizada, k) -> respuesta
+hot_answers: dict[tuple, str] = {}
+
+
+def hot_key(cleaned: str, k: int | None) -> tuple:
+    return (" ".join(cleaned.lower().split()), k)
+
+
+def cached_answer(cleaned: str, k: int | None) -> str | None:
+    return hot_answers.get(hot_key(cleaned, k))
+
+
+@traced_request("chat")
+def chat_with_agent(user_query: str, k: int | None = None) -> str:
+    cleaned = user_query.strip()
+
+    if len(cleaned) < 4:
+        return SHORT_QUERY_REPLY
+
+    cached = cached_answer(cleaned, k)
+    if cached is not None:
+        return cached
+    return answer_query(cleaned, k)
+
+
+def answer_query(cleaned: str, k: int | None = None, raw: list[dict] | None = None) -> str:
+    """
+    Pipeline completo sin caché. `raw` permite pasar candidatos ya buscados.
+    """
+    k_effective = k if k is not None else parse_num_songs_from_query(cleaned)
+    genre = detect_genre(cleaned)
+
+    if raw is None:
+        with span("search", k=k_effective, genre=genre):
+            raw = search_similar_tracks(
+                cleaned,
+                k=search_k(k_effective),
+                genre_filter=genre,
+            )
+
+    if not raw:
+        return NO_RESULTS_REPLY
+
+    results = rank_candidates(cleaned, raw, k_effective)
+    if not results:
+        return NO_RESULTS_REPLY
+
+    # Intento con LLM
+    llm_response = None
+    with span("llm", model=MODEL_NAME) as sp:
+        try:
+            llm_response = llm.complete(build_explanation_prompt(cleaned, results))
+        except Exception as e:
+            sp.set(error=type(e).__name__)
+
+    return finish_answer(cleaned, results, llm_response)
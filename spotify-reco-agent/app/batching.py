@@ -0,0 +1,62 @@
+# app/batching.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .tracing import span
+
+
+class EncodeBatcher:
+    """
+    Agrupa las peticiones de `encode` que llegan casi a la vez (dentro de
+    `max_wait_ms`) y las pasa al modelo en una sola llamada.
+
+    Las llamadas al modelo se hacen en un hilo aparte para no bloquear el
+    event loop; con un solo hilo los lotes se procesan de uno en uno.
+    """
+
+    def __init__(self, get_model, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self._get_model = get_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+
+    async def encode(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        with span("embed"):
+            return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]):
+        texts = [t for t, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            vecs = await loop.run_in_executor(
+                self._executor,
+                lambda: self._get_model().encode(texts, batch_size=len(texts)),
+            )
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), vec in zip(batch, vecs):
+            if not fut.done():
+                fut.set_result(vec.tolist())
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,76 @@
+# app/encoders.py
+"""
+Backends del codificador de consultas. Todos devuelven un objeto con
+`.encode(texto | lista, batch_size=...)`, igual que SentenceTransformer.
+
+SPOTIFAI_ENCODER:
+- torch      modelo PyTorch original (referencia)
+- quantized  mismo modelo con las capas Linear cuantizadas a int8 (torch dinámico)
+- onnx       exportado a ONNX y ejecutado con onnxruntime
+- onnx-int8  ONNX con cuantización dinámica int8
+
+Los backends ONNX necesitan `pip install "optimum[onnxruntime]"`. El modelo
+exportado se guarda en SPOTIFAI_ONNX_DIR y se reutiliza en los siguientes arranques.
+"""
+import importlib.util
+import os
+
+from dotenv import load_dotenv
+
+# scripts/embed_tracks.py importa este módulo antes de su propio load_dotenv()
+load_dotenv()
+
+EMBED_MODEL_NAME = "distiluse-base-multilingual-cased-v2"
+ENCODER_BACKEND = os.getenv("SPOTIFAI_ENCODER", "torch")
+ONNX_DIR = os.getenv("SPOTIFAI_ONNX_DIR", os.path.join("models", "distiluse-onnx"))
+# avx2 funciona en casi cualquier CPU x86 actual; avx512_vnni si el host lo soporta
+ONNX_QUANT_CONFIG = os.getenv("SPOTIFAI_ONNX_QUANT", "avx2")
+
+BACKENDS = ("torch", "quantized", "onnx", "onnx-int8")
+
+
+def _load_onnx(model_name: str, int8: bool):
+    from sentence_transformers import SentenceTransformer
+    if importlib.util.find_spec("optimum") is None or importlib.util.find_spec("optimum.onnxruntime") is None:
+        raise RuntimeError(
+            'El backend ONNX necesita optimum y onnxruntime: pip install "optimum[onnxruntime]"'
+        )
+
+    if not os.path.exists(os.path.join(ONNX_DIR, "onnx", "model.onnx")):
+        # primera vez: exportar y guardar junto a pooling/dense
+        SentenceTransformer(model_name, backend="onnx", device="cpu").save(ONNX_DIR)
+
+    if not int8:
+        return SentenceTransformer(ONNX_DIR, backend="onnx", device="cpu")
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    file_name = f"onnx/model_qint8_{ONNX_QUANT_CONFIG}.onnx"
+    if not os.path.exists(os.path.join(ONNX_DIR, file_name)):
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(ONNX_DIR, backend="onnx", device="cpu"),
+            ONNX_QUANT_CONFIG,
+            ONNX_DIR,
+        )
+    return SentenceTransformer(
+        ONNX_DIR, backend="onnx", device="cpu", model_kwargs={"file_name": file_name}
+    )
+
+
+def load_encoder(backend: str | None = None, model_name: str = EMBED_MODEL_NAME):
+    backend = backend or ENCODER_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de encoder desconocido: {backend!r} (opciones: {', '.join(BACKENDS)})")
+
+    if backend in ("onnx", "onnx-int8"):
+        return _load_onnx(model_name, int8=backend == "onnx-int8")
+
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        # GPU si la hay (carga masiva en scripts/embed_tracks.py)
+        return SentenceTransformer(model_name)
+
+    # la cuantización dinámica de torch solo funciona en CPU
+    import torch
+    model = SentenceTransformer(model_name, device="cpu")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
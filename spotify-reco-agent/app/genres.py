@@ -0,0 +1,124 @@
+# app/genres.py
+"""
+Taxonomía de géneros: cada Genre.name del dataset se asigna una vez (al
+cargar el grafo) a familias normalizadas, guardadas como
+(:Genre)-[:IN_FAMILY]->(:GenreFamily) y, en cada canción, como
+`t.families` (lista) y `t.family_mask` (entero con un bit por familia).
+
+Así la búsqueda filtra por igualdad y el ranking por máscara de bits, en
+lugar de comparar subcadenas en cada consulta.
+
+Cada máscara guardada (grafo o snapshot) va acompañada de TAXONOMY_VERSION;
+si no coincide con la de este fichero, se ignora y se recalcula desde los
+géneros hasta volver a ejecutar `python scripts/graph.py --families`.
+"""
+import json
+import zlib
+from functools import lru_cache
+
+# Familias que puede pedir el usuario (valores de agent.GENRE_KEYWORDS).
+# Mismo criterio que el antiguo `toLower(g) CONTAINS $genre`: subcadena.
+SEARCH_FAMILIES = [
+    "rock", "pop", "latin", "reggaeton", "indie", "acoustic",
+    "metal", "jazz", "hip hop", "rap",
+]
+
+# Familias de ranking/filtrado: coincidencia exacta del nombre en minúsculas
+CALM_GENRES = {"lofi", "ambient", "acoustic", "chill", "study", "piano", "classical", "soul"}
+NOISY_GENRES = {"gaming", "hardstyle", "edm", "metal", "techno", "drum and bass"}
+BLOCK_GENRES_DEFAULT = {
+    "korean", "japanese", "turkish", "arabic",
+    "cantopop", "indian", "thai", "russian",
+    "brazilian", "latin jazz", "anime", "j-pop",
+    "gaming", "world", "afrobeats"
+}
+
+# Bit fijo de cada familia. No cambiar ni reutilizar un bit ya publicado:
+# una familia nueva (buscable o no) toma el siguiente bit libre.
+FAMILY_BITS = {
+    "rock": 1 << 0,
+    "pop": 1 << 1,
+    "latin": 1 << 2,
+    "reggaeton": 1 << 3,
+    "indie": 1 << 4,
+    "acoustic": 1 << 5,
+    "metal": 1 << 6,
+    "jazz": 1 << 7,
+    "hip hop": 1 << 8,
+    "rap": 1 << 9,
+    "calm": 1 << 10,
+    "noisy": 1 << 11,
+    "blocked": 1 << 12,
+}
+FAMILIES = list(FAMILY_BITS)
+assert set(SEARCH_FAMILIES) <= set(FAMILY_BITS), "familia buscable sin bit en FAMILY_BITS"
+assert len(set(FAMILY_BITS.values())) == len(FAMILY_BITS), "bit repetido en FAMILY_BITS"
+
+# Huella de la taxonomía (bits y reglas): cambia sola al tocar cualquiera de ellas
+TAXONOMY_VERSION = zlib.crc32(json.dumps([
+    FAMILY_BITS, SEARCH_FAMILIES,
+    sorted(CALM_GENRES), sorted(NOISY_GENRES), sorted(BLOCK_GENRES_DEFAULT),
+], sort_keys=True).encode("utf-8"))
+
+CALM = FAMILY_BITS["calm"]
+NOISY = FAMILY_BITS["noisy"]
+BLOCKED = FAMILY_BITS["blocked"]
+
+
+@lru_cache(maxsize=None)
+def families_of(genre: str) -> tuple[str, ...]:
+    g = (genre or "").lower()
+    fams = [f for f in SEARCH_FAMILIES if f in g]
+    if g in CALM_GENRES:
+        fams.append("calm")
+    if g in NOISY_GENRES:
+        fams.append("noisy")
+    if g in BLOCK_GENRES_DEFAULT:
+        fams.append("blocked")
+    return tuple(fams)
+
+
+@lru_cache(maxsize=None)
+def _genre_bits(genre: str) -> int:
+    mask = 0
+    for f in families_of(genre):
+        mask |= FAMILY_BITS[f]
+    return mask
+
+
+def genre_mask(genres) -> int:
+    mask = 0
+    for g in genres or ():
+        mask |= _genre_bits(g)
+    return mask
+
+
+def track_families(genres) -> list[str]:
+    mask = genre_mask(genres)
+    return [f for f in FAMILIES if mask & FAMILY_BITS[f]]
+
+
+def track_mask(track: dict) -> int:
+    """
+    Máscara guardada en el grafo/snapshot o, si no existe, calculada de sus géneros.
+    """
+    mask = track.get("family_mask")
+    return mask if mask is not None else genre_mask(track.get("genres"))
+
+
+def search_family(genre: str) -> str:
+    """
+    Familia buscable por igualdad, o '' si `genre` es un texto libre.
+    """
+    g = (genre or "").strip().lower()
+    return g if g in SEARCH_FAMILIES else ""
+
+
+def matches_genre(track: dict, genre: str) -> bool:
+    if not genre:
+        return True
+    family = search_family(genre)
+    if family:
+        return bool(track_mask(track) & FAMILY_BITS[family])
+    genre = genre.lower()
+    return any(genre in (g or "").lower() for g in track.get("genres") or [])
@@ -1,9 +1,13 @@
 # app/neo4j_search.py
 import os
 from neo4j import GraphDatabase
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
+from .encoders import load_encoder
+from .genres import TAXONOMY_VERSION, matches_genre, search_family
+from .snapshot import SnapshotHolder
+from .tracing import span
+
 load_dotenv()
 
 URI = os.getenv("NEO4J_URI", "neo4j://localhost:7687")
@@ -14,8 +18,130 @@ DB   = os.getenv("NEO4J_DATABASE", "tracks")
 # Conexión a Neo4j (sin cifrado si es Desktop local)
 driver = GraphDatabase.driver(URI, auth=(USER, PASS), encrypted=False)
 
-# Mismo modelo que usaste para generar los embeddings
-embed_model = SentenceTransformer("distiluse-base-multilingual-cased-v2")
+# Mismo modelo que usaste para generar los embeddings (backend según SPOTIFAI_ENCODER)
+embed_model = None
+
+
+def get_embed_model():
+    """
+    Carga el modelo de embeddings la primera vez que se necesita.
+    Se puede sustituir asignando otro objeto con `.encode()` a `embed_model`.
+    """
+    global embed_model
+    if embed_model is None:
+        embed_model = load_encoder()
+    return embed_model
+
+
+# Versión que suben scripts/graph.py y scripts/embed_tracks.py (schema.bump_catalog_version)
+CATALOG_VERSION_CYPHER = """
+MATCH (c:CatalogVersion {id: 'spotifai'})
+RETURN c.version AS version
+"""
+
+
+def catalog_version():
+    with driver.session(database=DB) as session:
+        rec = session.run(CATALOG_VERSION_CYPHER).single()
+    return rec["version"] if rec else None
+
+
+# Snapshot del catálogo (app/snapshot.py): si existe y es de la versión del
+# catálogo que tiene el grafo, los candidatos se hidratan desde memoria en
+# lugar de expandir artista y géneros en el grafo.
+SNAPSHOT_DIR = os.getenv("SPOTIFAI_SNAPSHOT_DIR", "")
+snapshot = SnapshotHolder(SNAPSHOT_DIR, live_version=catalog_version).start() if SNAPSHOT_DIR else None
+
+
+# $family: familia de app/genres.py para filtrar por igualdad sobre node.families.
+# Si $genre es texto libre o las familias de la canción no son de esta
+# taxonomía ($taxonomy = genres.TAXONOMY_VERSION), se mantiene la comparación
+# por subcadena y no se devuelve la máscara.
+SEARCH_CYPHER = """
+CALL db.index.vector.queryNodes('track_embedding_index', $k*2, $vec)
+YIELD node, score
+WITH node, score
+WHERE $genre = '' OR $family = '' OR coalesce(node.family_taxonomy, -1) <> $taxonomy
+    OR $family IN node.families
+OPTIONAL MATCH (node)-[:BY_ARTIST]->(a:Artist)
+OPTIONAL MATCH (node)-[:HAS_GENRE]->(g:Genre)
+WITH node, score, a, collect(DISTINCT g.name) AS genres
+WHERE $genre = '' OR ($family <> '' AND node.family_taxonomy = $taxonomy)
+    OR ANY(gname IN genres WHERE toLower(gname) CONTAINS toLower($genre))
+RETURN node.id          AS id,
+       node.title       AS title,
+       coalesce(a.name,'') AS artist,
+       genres           AS genres,
+       node.popularity  AS popularity,
+       CASE WHEN node.family_taxonomy = $taxonomy THEN node.family_mask END AS family_mask,
+       score
+ORDER BY score DESC
+LIMIT $k
+"""
+
+
+SEARCH_IDS_CYPHER = """
+CALL db.index.vector.queryNodes('track_embedding_index', $n, $vec)
+YIELD node, score
+RETURN node.id AS id, score
+"""
+
+HYDRATE_CYPHER = """
+UNWIND $ids AS tid
+MATCH (node:Track {id: tid})
+OPTIONAL MATCH (node)-[:BY_ARTIST]->(a:Artist)
+OPTIONAL MATCH (node)-[:HAS_GENRE]->(g:Genre)
+WITH node, a, collect(DISTINCT g.name) AS genres
+RETURN node.id          AS id,
+       node.title       AS title,
+       coalesce(a.name,'') AS artist,
+       genres           AS genres,
+       node.popularity  AS popularity,
+       CASE WHEN node.family_taxonomy = $taxonomy THEN node.family_mask END AS family_mask
+"""
+
+
+def _hydrate_from_snapshot(snap, hits: list[dict]) -> tuple[dict, list[str]]:
+    found = {}
+    missing = []
+    for h in hits:
+        row = snap.get(h["id"])
+        if row is None:
+            missing.append(h["id"])
+        else:
+            found[h["id"]] = row
+    return found, missing
+
+
+def _merge_hits(hits: list[dict], found: dict, k: int, genre_filter: str) -> list[dict]:
+    """
+    Mismo filtro de género y orden que SEARCH_CYPHER, en Python.
+    """
+    rows = []
+    for h in sorted(hits, key=lambda h: h["score"], reverse=True):
+        row = found.get(h["id"])
+        if row is None:
+            continue
+        if not matches_genre(row, genre_filter):
+            continue
+        rows.append({**row, "score": h["score"]})
+        if len(rows) >= k:
+            break
+    return rows
+
+
+# Precalculados por app/warmup.py para las peticiones más frecuentes.
+# Se sustituyen enteros (nunca se modifican en sitio).
+hot_vectors: dict[str, list[float]] = {}
+hot_results: dict[tuple, list[dict]] = {}
+
+
+def encode_query(prompt: str) -> list[float]:
+    q_vec = hot_vectors.get(prompt)
+    if q_vec is not None:
+        return q_vec
+    with span("embed"):
+        return get_embed_model().encode(prompt).tolist()
 
 
 def search_similar_tracks(prompt: str, k: int = 10, genre_filter: str = ""):
@@ -23,73 +149,199 @@ def search_similar_tracks(prompt: str, k: int = 10, genre_filter: str = ""):
     Dado un texto tipo 'indie tranquilo para estudiar', busca canciones similares
     usando el índice vectorial track_embedding_index.
     """
-    q_vec = embed_model.encode(prompt).tolist()
-
-    cypher = """
-    CALL db.index.vector.queryNodes('track_embedding_index', $k*2, $vec)
-    YIELD node, score
-    OPTIONAL MATCH (node)-[:BY_ARTIST]->(a:Artist)
-    OPTIONAL MATCH (node)-[:HAS_GENRE]->(g:Genre)
-    WITH node, score, a, collect(DISTINCT g.name) AS genres
-    WHERE $genre = ''
-        OR ANY(gname IN genres WHERE toLower(gname) CONTAINS toLower($genre))
-    RETURN node.id          AS id,
-           node.title       AS title,
-           coalesce(a.name,'') AS artist,
-           genres           AS genres,
-           node.popularity  AS popularity,
-           score
-    ORDER BY score DESC
-    LIMIT $k
+    cached = hot_results.get((prompt, k, genre_filter))
+    if cached is not None:
+        return [dict(r) for r in cached]
+    return search_by_vector(encode_query(prompt), k=k, genre_filter=genre_filter)
+
+
+def search_by_vector(q_vec: list[float], k: int = 10, genre_filter: str = ""):
+    snap = snapshot.get() if snapshot is not None else None
+    with span("neo4j.search_similar_tracks", vec=q_vec, k=k, genre=genre_filter) as sp, \
+         driver.session(database=DB) as session:
+        if snap is None:
+            rows = session.run(
+                SEARCH_CYPHER, vec=q_vec, k=k, genre=genre_filter,
+                family=search_family(genre_filter), taxonomy=TAXONOMY_VERSION,
+            ).data()
+        else:
+            hits = session.run(SEARCH_IDS_CYPHER, vec=q_vec, n=k * 2).data()
+            found, missing = _hydrate_from_snapshot(snap, hits)
+            # canciones añadidas después del snapshot: se completan desde el grafo
+            if missing:
+                found.update({r["id"]: r for r in session.run(HYDRATE_CYPHER, ids=missing, taxonomy=TAXONOMY_VERSION).data()})
+            rows = _merge_hits(hits, found, k, genre_filter)
+            sp.set(snapshot=snap.version, missing=len(missing))
+        sp.set(rows=len(rows))
+    return rows
+
+
+def catalog_stamp() -> tuple:
+    """
+    Identifica la versión del catálogo: la del grafo y la del snapshot activo.
     """
+    snap = snapshot.get() if snapshot is not None else None
+    return (catalog_version(), snap.version if snap else None)
 
-    with driver.session(database=DB) as session:
-        rows = session.run(cypher, vec=q_vec, k=k, genre=genre_filter).data()
+
+async def search_by_vector_async(async_driver, q_vec: list[float], k: int = 10, genre_filter: str = ""):
+    """
+    Como search_by_vector, con el driver asíncrono (lo usa app/service.py).
+    """
+    snap = snapshot.get() if snapshot is not None else None
+    with span("neo4j.search_similar_tracks", vec=q_vec, k=k, genre=genre_filter) as sp:
+        async with async_driver.session(database=DB) as session:
+            if snap is None:
+                result = await session.run(
+                    SEARCH_CYPHER, vec=q_vec, k=k, genre=genre_filter,
+                    family=search_family(genre_filter), taxonomy=TAXONOMY_VERSION,
+                )
+                rows = await result.data()
+            else:
+                hits = await (await session.run(SEARCH_IDS_CYPHER, vec=q_vec, n=k * 2)).data()
+                found, missing = _hydrate_from_snapshot(snap, hits)
+                if missing:
+                    extra = await (await session.run(HYDRATE_CYPHER, ids=missing, taxonomy=TAXONOMY_VERSION)).data()
+                    found.update({r["id"]: r for r in extra})
+                rows = _merge_hits(hits, found, k, genre_filter)
+                sp.set(snapshot=snap.version, missing=len(missing))
+        sp.set(rows=len(rows))
     return rows
 
 
+SAMPLE_TRACKS_CYPHER = """
+MATCH (t:Track)-[:BY_ARTIST]->(a:Artist)
+WHERE t.popularity IS NOT NULL
+WITH t, a
+ORDER BY t.popularity DESC, rand()   // primero populares, luego aleatorio
+RETURN t.id   AS id,
+       t.title AS title,
+       a.name AS artist,
+       t.popularity AS popularity
+LIMIT $limit
+"""
+
+
 def get_sample_tracks(limit: int = 20):
     """
     Devuelve canciones relativamente conocidas para configurar el perfil.
     Priorizamos por popularidad y luego aleatorizamos un poco.
     """
-    cypher = """
-    MATCH (t:Track)-[:BY_ARTIST]->(a:Artist)
-    WHERE t.popularity IS NOT NULL
-    WITH t, a
-    ORDER BY t.popularity DESC, rand()   // primero populares, luego aleatorio
-    RETURN t.id   AS id,
-           t.title AS title,
-           a.name AS artist,
-           t.popularity AS popularity
-    LIMIT $limit
+    with span("neo4j.get_sample_tracks", limit=limit), driver.session(database=DB) as session:
+        return session.run(SAMPLE_TRACKS_CYPHER, limit=limit).data()
+
+
+SAVE_PREFERENCES_CYPHER = """
+UNWIND $rows AS row
+MERGE (u:User {id: row.user_id})
+WITH u, row
+MATCH (t:Track {id: row.id})
+MERGE (u)-[r:LIKES]->(t)
+SET r.rating = row.rating
+"""
+
+# Datos derivados de las valoraciones, guardados en el propio User:
+# géneros que puntúa mal (< 3 de media) y rasgos medios de lo que le gusta (>= 4)
+USER_PROFILE_CYPHER = """
+UNWIND $user_ids AS uid
+MATCH (u:User {id: uid})
+CALL {
+  WITH u
+  OPTIONAL MATCH (u)-[r:LIKES]->(:Track)-[:HAS_GENRE]->(g:Genre)
+  WITH g.name AS genre, avg(r.rating) AS avg_rating
+  WHERE avg_rating < 3
+  RETURN collect(genre) AS disliked_genres
+}
+CALL {
+  WITH u
+  OPTIONAL MATCH (u)-[r:LIKES]->(t:Track)
+  WHERE r.rating >= 4
+  RETURN count(t) AS liked,
+         avg(t.energy) AS energy, avg(t.danceability) AS danceability,
+         avg(t.acousticness) AS acousticness, avg(t.valence) AS valence,
+         avg(t.tempo) AS tempo
+}
+SET u.disliked_genres = disliked_genres,
+    u.liked_count = liked,
+    u.profile_energy = energy, u.profile_danceability = danceability,
+    u.profile_acousticness = acousticness, u.profile_valence = valence,
+    u.profile_tempo = tempo,
+    u.profile_updated_at = datetime()
+"""
+
+
+def save_preferences_batch(rows: list[dict]) -> int:
     """
-    with driver.session(database=DB) as session:
-        return session.run(cypher, limit=limit).data()
+    Escribe valoraciones de uno o varios usuarios en una sola transacción.
+    rows: [{user_id, id, rating}]
+    """
+    if not rows:
+        return 0
+    with span("neo4j.save_preferences_batch", rows=len(rows)), \
+         driver.session(database=DB) as session:
+        session.execute_write(lambda tx: tx.run(SAVE_PREFERENCES_CYPHER, rows=rows).consume())
+    return len(rows)
+
+
+def refresh_user_profiles(user_ids: list[str]):
+    """
+    Recalcula disliked_genres y los rasgos medios (profile_*) de cada usuario.
+    """
+    if not user_ids:
+        return
+    with span("neo4j.refresh_user_profiles", users=len(user_ids)), \
+         driver.session(database=DB) as session:
+        session.execute_write(lambda tx: tx.run(USER_PROFILE_CYPHER, user_ids=user_ids).consume())
 
 
 def save_user_preferences(user_id: str, ratings: dict):
     """
-    Guarda en Neo4j las valoraciones del usuario.
+    Guarda en Neo4j las valoraciones del usuario (de forma síncrona).
     ratings: dict { track_id (str) -> rating (int 0-5) }
     Crea (:User {id:user_id})-[:LIKES {rating:...}]->(:Track)
-    """
-    cypher = """
-    MERGE (u:User {id: $user_id})
-    WITH u
-    UNWIND $pairs AS pr
-    MATCH (t:Track {id: pr.id})
-    MERGE (u)-[r:LIKES]->(t)
-    SET r.rating = pr.rating
-    """
 
+    La app usa app/preferences.py, que agrupa las escrituras en segundo plano.
+    """
     # track_id ahora es string (id de Spotify), NO lo convertimos a int
-    pairs = [{"id": str(tid), "rating": int(r)} for tid, r in ratings.items()]
-    if not pairs:
+    rows = [{"user_id": user_id, "id": str(tid), "rating": int(r)} for tid, r in ratings.items()]
+    if not rows:
         return
+    save_preferences_batch(rows)
+    refresh_user_profiles([user_id])
+
+
+USER_DISLIKED_CYPHER = """
+MATCH (u:User {id: $user_id})
+RETURN u.disliked_genres AS disliked_genres
+"""
+
+DISLIKED_GENRES_CYPHER = """
+MATCH (u:User {id: $user_id})-[r:LIKES]->(t:Track)-[:HAS_GENRE]->(g:Genre)
+WITH g.name AS genre, avg(r.rating) AS avg_rating
+WHERE avg_rating < 3
+RETURN collect(genre) AS disliked_genres
+"""
+
+PREFERENCE_TRACKS_CYPHER = """
+MATCH (t:Track)-[:BY_ARTIST]->(a:Artist)
+OPTIONAL MATCH (t)-[:HAS_GENRE]->(g:Genre)
+WITH t, a, collect(DISTINCT g.name) AS genres
+WHERE t.popularity IS NOT NULL
+  AND (
+    size(genres) = 0 OR
+    NONE(gn IN genres WHERE gn IN $disliked_genres)
+  )
+RETURN t.id        AS id,
+       t.title     AS title,
+       a.name      AS artist,
+       t.popularity AS popularity,
+       genres      AS genres
+ORDER BY t.popularity DESC, t.id ASC
+SKIP $skip
+LIMIT $limit
+"""
+
 
-    with driver.session(database=DB) as session:
-        session.run(cypher, user_id=user_id, pairs=pairs)
 def get_preference_tracks(user_id: str, limit: int = 20, page: int = 0):
     """
     Devuelve un bloque de canciones para que el usuario configure su perfil.
@@ -97,52 +349,49 @@ def get_preference_tracks(user_id: str, limit: int = 20, page: int = 0):
     - Paginadas: 'page' controla qué bloque de 20 se devuelve
     - Evita géneros que el propio usuario ha puntuado mal (< 3 de media)
     """
-    with driver.session(database=DB) as session:
-        # 1) Géneros que el usuario suele valorar MAL
-        dislike_result = session.run(
-            """
-            MATCH (u:User {id: $user_id})-[r:LIKES]->(t:Track)-[:HAS_GENRE]->(g:Genre)
-            WITH g.name AS genre, avg(r.rating) AS avg_rating
-            WHERE avg_rating < 3
-            RETURN collect(genre) AS disliked_genres
-            """,
-            user_id=user_id,
-        ).single()
-
-        disliked_genres = dislike_result["disliked_genres"] if dislike_result and dislike_result["disliked_genres"] else []
+    with span("neo4j.get_preference_tracks", user_id=user_id, limit=limit, page=page), \
+         driver.session(database=DB) as session:
+        # 1) Géneros que el usuario suele valorar MAL (precalculados al guardar)
+        profile = session.run(USER_DISLIKED_CYPHER, user_id=user_id).single()
+        disliked_genres = profile["disliked_genres"] if profile else []
+
+        if disliked_genres is None:
+            # usuario con valoraciones anteriores al perfil precalculado
+            dislike_result = session.run(DISLIKED_GENRES_CYPHER, user_id=user_id).single()
+            disliked_genres = dislike_result["disliked_genres"] if dislike_result and dislike_result["disliked_genres"] else []
 
         # 2) Canciones populares, evitando esos géneros
         tracks = session.run(
-            """
-            MATCH (t:Track)-[:BY_ARTIST]->(a:Artist)
-            OPTIONAL MATCH (t)-[:HAS_GENRE]->(g:Genre)
-            WITH t, a, collect(DISTINCT g.name) AS genres
-            WHERE t.popularity IS NOT NULL
-              AND (
-                size(genres) = 0 OR
-                NONE(gn IN genres WHERE gn IN $disliked_genres)
-              )
-            RETURN t.id        AS id,
-                   t.title     AS title,
-                   a.name      AS artist,
-                   t.popularity AS popularity,
-                   genres      AS genres
-            ORDER BY t.popularity DESC, t.id ASC
-            SKIP $skip
-            LIMIT $limit
-            """,
+            PREFERENCE_TRACKS_CYPHER,
             disliked_genres=disliked_genres,
             skip=page * limit,
             limit=limit,
         ).data()
 
     return tracks
+
+
+# Índice full-text artist_name_fulltext (scripts/schema.py): sin mayúsculas
+# y sin recorrer todos los Artist como hacía `toLower(a.name) CONTAINS`.
+ARTIST_EXISTS_CYPHER = """
+CALL db.index.fulltext.queryNodes('artist_name_fulltext', $query, {limit: 1})
+YIELD node
+RETURN count(node) > 0 AS exists
+"""
+
+
 def artist_exists(name: str) -> bool:
-    cypher = """
-    MATCH (a:Artist)
-    WHERE toLower(a.name) CONTAINS toLower($name)
-    RETURN count(a) > 0 AS exists
     """
-    with driver.session(database=DB) as session:
-        rec = session.run(cypher, name=name).single()
+    True si algún artista contiene `name` como frase: mismas palabras, en el
+    mismo orden y sin distinguir mayúsculas ("coldplay" encuentra "Coldplay",
+    "the beatles" encuentra "The Beatles"). A diferencia del antiguo
+    `toLower(a.name) CONTAINS`, un trozo de palabra ("cold") no coincide.
+    """
+    name = (name or "").strip()
+    if not name:
+        return False
+    # frase exacta de Lucene: solo hay que escapar la barra y las comillas
+    query = '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    with span("neo4j.artist_exists", name=name), driver.session(database=DB) as session:
+        rec = session.run(ARTIST_EXISTS_CYPHER, query=query).single()
     return rec["exists"] if rec else False
\ No newline at end of file
@@ -0,0 +1,162 @@
+# app/preferences.py
+"""
+Cola de escritura de valoraciones.
+
+`submit()` solo apunta las valoraciones y vuelve enseguida. Un hilo en
+segundo plano las agrupa por usuario (la última nota de cada canción gana),
+las escribe en transacciones UNWIND de hasta SPOTIFAI_PREF_BATCH filas y,
+después, recalcula en otro hilo el perfil derivado de esos usuarios
+(géneros que puntúan mal y rasgos medios, ver neo4j_search.refresh_user_profiles).
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import neo4j_search
+from .tracing import span
+
+MAX_BATCH = int(os.getenv("SPOTIFAI_PREF_BATCH", "500"))
+MAX_WAIT_MS = float(os.getenv("SPOTIFAI_PREF_WAIT_MS", "200"))
+RETRY_S = 2.0
+
+log = logging.getLogger("spotifai.preferences")
+
+
+class PreferenceWriter:
+    """
+    on_saved(user_id) se llama cuando las valoraciones de ese usuario ya están
+    escritas y su perfil recalculado (p. ej. para invalidar cachés).
+    """
+
+    def __init__(self, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS, on_saved=None):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.on_saved = on_saved
+        self._pending: dict[str, dict[str, int]] = {}
+        self._errors: dict[str, str] = {}  # user_id -> último fallo, hasta que se escriba bien
+        self._writing = False
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self._profiles = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pref-profile")
+        self._last_profile = None
+
+    def submit(self, user_id: str, ratings: dict) -> int:
+        """
+        Encola las valoraciones { track_id -> rating } y devuelve cuántas
+        hay pendientes de ese usuario.
+        """
+        with self._cond:
+            pending = self._pending.setdefault(user_id, {})
+            # track_id ahora es string (id de Spotify), NO lo convertimos a int
+            pending.update((str(tid), int(r)) for tid, r in ratings.items())
+            self._cond.notify_all()
+            return len(pending)
+
+    def pending(self, user_id: str | None = None) -> int:
+        with self._cond:
+            if user_id is not None:
+                return len(self._pending.get(user_id, ()))
+            return sum(len(r) for r in self._pending.values())
+
+    def error(self, user_id: str) -> str | None:
+        """
+        Motivo del último intento fallido de guardar las valoraciones del
+        usuario (se siguen reintentando), o None si no hay fallos pendientes.
+        """
+        with self._cond:
+            return self._errors.get(user_id)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Espera a que se escriba todo lo encolado y a que terminen los
+        recálculos de perfil. Devuelve False si se agota el tiempo.
+        """
+        with self._cond:
+            self._cond.notify_all()
+            if not self._cond.wait_for(lambda: not self._pending and not self._writing, timeout):
+                return False
+            last = self._last_profile
+        if last is not None:
+            try:
+                last.result(timeout)
+            except Exception:
+                return False
+        return True
+
+    def start(self) -> "PreferenceWriter":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="pref-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Escribe lo pendiente y para los hilos.
+        """
+        self.flush(timeout)
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._profiles.shutdown(wait=False)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stop)
+                if self._stop and not self._pending:
+                    return
+                # margen para juntar más valoraciones, salvo que ya haya un lote lleno
+                self._cond.wait_for(
+                    lambda: self._stop or sum(len(r) for r in self._pending.values()) >= self.max_batch,
+                    self.max_wait,
+                )
+                batch, self._pending = self._pending, {}
+                self._writing = True
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                log.exception("No se pudieron guardar valoraciones de %d usuarios", len(batch))
+                with self._cond:
+                    for user_id in batch:
+                        self._errors[user_id] = f"{type(e).__name__}: {e}"
+                    # reencolar sin pisar notas más recientes
+                    for user_id, ratings in batch.items():
+                        self._pending[user_id] = {**ratings, **self._pending.get(user_id, {})}
+                    self._writing = False
+                    self._cond.notify_all()
+                    self._cond.wait_for(lambda: self._stop, RETRY_S)
+                continue
+
+            with self._cond:
+                for user_id in batch:
+                    self._errors.pop(user_id, None)
+                self._last_profile = self._profiles.submit(self._refresh_profiles, list(batch))
+                self._writing = False
+                self._cond.notify_all()
+
+    def _write(self, batch: dict[str, dict[str, int]]):
+        rows = [
+            {"user_id": user_id, "id": tid, "rating": rating}
+            for user_id, ratings in batch.items()
+            for tid, rating in ratings.items()
+        ]
+        with span("preferences.write", users=len(batch), rows=len(rows)):
+            for i in range(0, len(rows), self.max_batch):
+                neo4j_search.save_preferences_batch(rows[i:i + self.max_batch])
+
+    def _refresh_profiles(self, user_ids: list[str]):
+        try:
+            with span("preferences.profiles", users=len(user_ids)):
+                neo4j_search.refresh_user_profiles(user_ids)
+        except Exception:
+            log.exception("No se pudo recalcular el perfil de %d usuarios", len(user_ids))
+        # las valoraciones ya están escritas aunque falle el perfil
+        if self.on_saved is not None:
+            for user_id in user_ids:
+                try:
+                    self.on_saved(user_id)
+                except Exception:
+                    log.exception("Fallo en on_saved(%r)", user_id)
@@ -0,0 +1,159 @@
+# app/service.py
+"""
+Servicio HTTP asíncrono con búsqueda y chat sobre los mismos módulos de `app`.
+
+    python -m app.service --port 8080
+
+POST /search  {"query": "...", "k": 10, "genre": "rock"}  -> {"tracks": [...]}
+POST /chat    {"query": "...", "k": 7}                    -> {"answer": "..."}
+GET  /metrics (formato Prometheus) · GET /health
+"""
+import argparse
+import asyncio
+
+from aiohttp import web
+from neo4j import AsyncGraphDatabase
+
+from . import agent, neo4j_search, tracing
+from .batching import EncodeBatcher
+from .tracing import span, traced_request
+from .warmup import EXAMPLE_PROMPTS, Warmup, load_hot_prompts
+
+DRIVER = web.AppKey("driver", object)
+BATCHER = web.AppKey("batcher", EncodeBatcher)
+BATCH_CONFIG = web.AppKey("batch_config", dict)
+
+
+async def search_tracks(app: web.Application, query: str, k: int, genre: str = "") -> list[dict]:
+    q_vec = neo4j_search.hot_vectors.get(query)
+    if q_vec is None:
+        q_vec = await app[BATCHER].encode(query)
+    return await neo4j_search.search_by_vector_async(app[DRIVER], q_vec, k=k, genre_filter=genre)
+
+
+@traced_request("chat")
+async def chat(app: web.Application, user_query: str, k: int | None = None) -> str:
+    """
+    Versión asíncrona de agent.chat_with_agent: mismos pasos, pero la E/S
+    (Neo4j, Ollama) no bloquea y el trabajo de CPU va a un hilo.
+    """
+    cleaned = user_query.strip()
+    if len(cleaned) < 4:
+        return agent.SHORT_QUERY_REPLY
+
+    cached = agent.cached_answer(cleaned, k)
+    if cached is not None:
+        return cached
+
+    k_effective = k if k is not None else agent.parse_num_songs_from_query(cleaned)
+    genre = agent.detect_genre(cleaned)
+
+    with span("search", k=k_effective, genre=genre):
+        raw = await search_tracks(app, cleaned, agent.search_k(k_effective), genre)
+    if not raw:
+        return agent.NO_RESULTS_REPLY
+
+    # langdetect y el re-ranking son CPU: fuera del event loop
+    results = await asyncio.to_thread(agent.rank_candidates, cleaned, raw, k_effective)
+    if not results:
+        return agent.NO_RESULTS_REPLY
+
+    llm_response = None
+    with span("llm", model=agent.MODEL_NAME) as sp:
+        prompt = agent.build_explanation_prompt(cleaned, results)
+        try:
+            if hasattr(agent.llm, "acomplete"):
+                llm_response = await agent.llm.acomplete(prompt)
+            else:
+                llm_response = await asyncio.to_thread(agent.llm.complete, prompt)
+        except Exception as e:
+            sp.set(error=type(e).__name__)
+
+    return agent.finish_answer(cleaned, results, llm_response)
+
+
+async def _read_query(request: web.Request) -> dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="El cuerpo debe ser JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="El cuerpo debe ser un objeto JSON")
+    query = body.get("query")
+    if query is not None and not isinstance(query, str):
+        raise web.HTTPBadRequest(text="'query' debe ser un texto")
+    query = (query or "").strip()
+    if not query:
+        raise web.HTTPBadRequest(text="Falta 'query'")
+    k = body.get("k")
+    # bool es subclase de int: `true` no es un k válido
+    if k is not None and (isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= 100):
+        raise web.HTTPBadRequest(text="'k' debe ser un entero entre 1 y 100")
+    genre = body.get("genre")
+    if genre is not None and not isinstance(genre, str):
+        raise web.HTTPBadRequest(text="'genre' debe ser un texto")
+    return {"query": query, "k": k, "genre": genre}
+
+
+async def handle_search(request: web.Request) -> web.Response:
+    params = await _read_query(request)
+    genre = params["genre"] if params["genre"] is not None else agent.detect_genre(params["query"])
+    tracks = await search_tracks(request.app, params["query"], params["k"] or 10, genre)
+    return web.json_response({"tracks": tracks})
+
+
+async def handle_chat(request: web.Request) -> web.Response:
+    params = await _read_query(request)
+    answer = await chat(request.app, params["query"], params["k"])
+    return web.json_response({"answer": answer})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=tracing.prometheus_text(), content_type="text/plain")
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def _lifecycle(app: web.Application):
+    app[DRIVER] = AsyncGraphDatabase.driver(
+        neo4j_search.URI, auth=(neo4j_search.USER, neo4j_search.PASS), encrypted=False
+    )
+    app[BATCHER] = EncodeBatcher(
+        neo4j_search.get_embed_model,
+        **app[BATCH_CONFIG],
+    )
+    # cargar el modelo antes de aceptar peticiones
+    await app[BATCHER].encode("warm up")
+    # respuestas calientes en un hilo (usa el driver síncrono de neo4j_search)
+    warmup = Warmup(EXAMPLE_PROMPTS + load_hot_prompts()).start()
+    yield
+    warmup.stop()
+    app[BATCHER].close()
+    await app[DRIVER].close()
+
+
+def create_app(max_batch: int = 32, max_wait_ms: float = 5.0) -> web.Application:
+    app = web.Application()
+    app[BATCH_CONFIG] = {"max_batch": max_batch, "max_wait_ms": max_wait_ms}
+    app.cleanup_ctx.append(_lifecycle)
+    app.router.add_post("/search", handle_search)
+    app.router.add_post("/chat", handle_chat)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP de recomendaciones de SpotifAI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch", type=int, default=32, help="máximo de textos por pasada del modelo")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="ventana para agrupar peticiones")
+    args = parser.parse_args()
+    web.run_app(create_app(args.max_batch, args.max_wait_ms), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
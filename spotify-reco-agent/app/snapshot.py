@@ -0,0 +1,328 @@
+# app/snapshot.py
+"""
+Snapshot columnar del catálogo para hidratar candidatos sin recorrer el grafo.
+
+Formato (un directorio por versión, todo con np.load(mmap_mode="r")):
+
+    snapshots/
+      CURRENT                 -> nombre de la versión activa (se cambia con os.replace)
+      v20261019-120000/
+        meta.json             versión, CatalogVersion del grafo, nº de canciones,
+                              vocabulario de géneros, taxonomía
+        ids.bin / ids_off.npy         ids (utf-8 + offsets)
+        titles.bin / titles_off.npy   títulos
+        artists.bin / artists_off.npy nombres de artista (diccionario)
+        artist_idx.npy        int32, índice en artists (-1 = sin artista)
+        genre_off.npy / genre_idx.npy géneros por canción (CSR sobre el vocabulario)
+        popularity.npy        int16 (-1 = nulo)
+        family_mask.npy       int32, familias de app/genres.py (se ignora si meta.json
+                              trae otra taxonomía o ninguna)
+        features.npy          float32 [n, 5] (NaN = nulo)
+
+Exportar desde Neo4j:
+    python -m app.snapshot export --out snapshots
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .genres import TAXONOMY_VERSION, genre_mask
+
+FEATURES = ("energy", "danceability", "acousticness", "valence", "tempo")
+CURRENT_FILE = "CURRENT"
+
+log = logging.getLogger("spotifai.snapshot")
+
+EXPORT_CYPHER = """
+MATCH (t:Track)
+OPTIONAL MATCH (t)-[:BY_ARTIST]->(a:Artist)
+OPTIONAL MATCH (t)-[:HAS_GENRE]->(g:Genre)
+WITH t, head(collect(DISTINCT a.name)) AS artist, collect(DISTINCT g.name) AS genres
+RETURN t.id AS id, t.title AS title, coalesce(artist, '') AS artist, genres,
+       t.popularity AS popularity,
+       CASE WHEN t.family_taxonomy = $taxonomy THEN t.family_mask END AS family_mask,
+       t.energy AS energy, t.danceability AS danceability,
+       t.acousticness AS acousticness, t.valence AS valence, t.tempo AS tempo
+"""
+
+
+def _write_strings(path: str, name: str, values: list[str]):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(path, f"{name}.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(path, f"{name}_off.npy"), offsets)
+
+
+class _Strings:
+    def __init__(self, path: str, name: str):
+        self._off = np.load(os.path.join(path, f"{name}_off.npy"), mmap_mode="r")
+        blob_path = os.path.join(path, f"{name}.bin")
+        if os.path.getsize(blob_path):
+            self._blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            self._blob = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._off) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self._blob[self._off[i]:self._off[i + 1]].tobytes().decode("utf-8")
+
+
+def write_snapshot(rows, root: str, version: str | None = None, catalog_version=None) -> str:
+    """
+    Escribe un snapshot nuevo a partir de filas {id, title, artist, genres,
+    popularity, <features>} y lo activa. Devuelve el nombre de la versión.
+    `catalog_version` es la (:CatalogVersion).version del grafo exportado.
+    """
+    version = version or f"v{datetime.now():%Y%m%d-%H%M%S}"
+    path = os.path.join(root, version)
+    tmp = path + ".tmp"
+    os.makedirs(tmp, exist_ok=False)
+    try:
+        _write_columns(rows, tmp, version, catalog_version)
+        os.replace(tmp, path)
+    except BaseException:
+        # no dejar un .tmp a medias que bloquee la siguiente exportación
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    _set_current(root, version)
+    return version
+
+
+def _write_columns(rows, tmp: str, version: str, catalog_version):
+    ids, titles = [], []
+    artists, artist_pos, artist_idx = [], {}, []
+    genres, genre_pos, genre_idx, genre_off = [], {}, [], [0]
+    popularity, features, family_mask = [], [], []
+
+    for r in rows:
+        ids.append(r["id"])
+        titles.append(r.get("title") or "")
+
+        name = r.get("artist") or ""
+        if name:
+            if name not in artist_pos:
+                artist_pos[name] = len(artists)
+                artists.append(name)
+            artist_idx.append(artist_pos[name])
+        else:
+            artist_idx.append(-1)
+
+        for g in r.get("genres") or []:
+            if g not in genre_pos:
+                genre_pos[g] = len(genres)
+                genres.append(g)
+            genre_idx.append(genre_pos[g])
+        genre_off.append(len(genre_idx))
+
+        pop = r.get("popularity")
+        popularity.append(-1 if pop is None else int(pop))
+        mask = r.get("family_mask")
+        family_mask.append(genre_mask(r.get("genres")) if mask is None else int(mask))
+        features.append([np.nan if r.get(f) is None else float(r[f]) for f in FEATURES])
+
+    _write_strings(tmp, "ids", ids)
+    _write_strings(tmp, "titles", titles)
+    _write_strings(tmp, "artists", artists)
+    np.save(os.path.join(tmp, "artist_idx.npy"), np.asarray(artist_idx, dtype=np.int32))
+    np.save(os.path.join(tmp, "genre_off.npy"), np.asarray(genre_off, dtype=np.int64))
+    np.save(os.path.join(tmp, "genre_idx.npy"), np.asarray(genre_idx, dtype=np.int32))
+    np.save(os.path.join(tmp, "popularity.npy"), np.asarray(popularity, dtype=np.int16))
+    np.save(os.path.join(tmp, "family_mask.npy"), np.asarray(family_mask, dtype=np.int32))
+    np.save(os.path.join(tmp, "features.npy"), np.asarray(features, dtype=np.float32).reshape(-1, len(FEATURES)))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "catalog_version": catalog_version,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "tracks": len(ids),
+            "features": list(FEATURES),
+            "genres": genres,
+            "taxonomy": TAXONOMY_VERSION,
+        }, f, ensure_ascii=False)
+
+
+def _set_current(root: str, version: str):
+    # os.replace es atómico: los lectores ven la versión vieja o la nueva, nunca a medias
+    tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+
+def current_version(root: str) -> str | None:
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class CatalogSnapshot:
+    """
+    Vista de solo lectura de una versión del snapshot.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.catalog_version = self.meta.get("catalog_version")
+        self.genre_names = self.meta["genres"]
+
+        self._titles = _Strings(path, "titles")
+        self._artists = _Strings(path, "artists")
+        self._artist_idx = np.load(os.path.join(path, "artist_idx.npy"), mmap_mode="r")
+        self._genre_off = np.load(os.path.join(path, "genre_off.npy"), mmap_mode="r")
+        self._genre_idx = np.load(os.path.join(path, "genre_idx.npy"), mmap_mode="r")
+        self._popularity = np.load(os.path.join(path, "popularity.npy"), mmap_mode="r")
+        self._features = np.load(os.path.join(path, "features.npy"), mmap_mode="r")
+        # máscaras de otra taxonomía: genres.track_mask las recalcula de los géneros
+        self._family_mask = None
+        if self.meta.get("taxonomy") == TAXONOMY_VERSION:
+            self._family_mask = np.load(os.path.join(path, "family_mask.npy"), mmap_mode="r")
+        else:
+            log.warning("Snapshot %s con otra taxonomía de géneros: se ignora family_mask", self.version)
+
+        ids = _Strings(path, "ids")
+        self._pos = {ids[i]: i for i in range(len(ids))}
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._pos
+
+    def get(self, track_id: str) -> dict | None:
+        """
+        Misma forma que las filas de search_similar_tracks (sin score).
+        """
+        i = self._pos.get(track_id)
+        if i is None:
+            return None
+        a = int(self._artist_idx[i])
+        pop = int(self._popularity[i])
+        return {
+            "id": track_id,
+            "title": self._titles[i],
+            "artist": self._artists[a] if a >= 0 else "",
+            "genres": [self.genre_names[g] for g in self._genre_idx[self._genre_off[i]:self._genre_off[i + 1]]],
+            "popularity": None if pop < 0 else pop,
+            "family_mask": None if self._family_mask is None else int(self._family_mask[i]),
+        }
+
+    def features(self, track_id: str) -> dict | None:
+        i = self._pos.get(track_id)
+        if i is None:
+            return None
+        return {
+            f: (None if np.isnan(v) else float(v))
+            for f, v in zip(FEATURES, self._features[i])
+        }
+
+
+class SnapshotHolder:
+    """
+    Mantiene la versión activa. Un hilo en segundo plano mira CURRENT cada
+    `check_every` segundos y, si apunta a otra versión, la carga y la publica
+    con una sola asignación: `get()` nunca lee disco en la ruta de la petición.
+
+    Con `live_version` (función que devuelve la CatalogVersion del grafo), un
+    snapshot exportado de otra versión no se publica: `get()` devuelve None y
+    la búsqueda va por Cypher hasta que se exporte uno nuevo.
+    """
+
+    def __init__(self, root: str, check_every: float = 30.0, live_version=None):
+        self.root = root
+        self.check_every = check_every
+        self.live_version = live_version
+        self._loaded: CatalogSnapshot | None = None
+        self._snapshot: CatalogSnapshot | None = None
+        self._stale = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def get(self) -> CatalogSnapshot | None:
+        return self._snapshot
+
+    def refresh(self) -> CatalogSnapshot | None:
+        with self._lock:
+            version = current_version(self.root)
+            if version and (self._loaded is None or self._loaded.version != version):
+                self._loaded = CatalogSnapshot(os.path.join(self.root, version))
+            snap = self._loaded
+            if snap is not None and self.live_version is not None:
+                live = self.live_version()
+                if snap.catalog_version != live:
+                    if self._stale != (snap.version, live):
+                        log.warning("Snapshot %s es del catálogo %s y el grafo está en %s: se ignora",
+                                    snap.version, snap.catalog_version, live)
+                        self._stale = (snap.version, live)
+                    snap = None
+            self._snapshot = snap
+            return snap
+
+    def start(self) -> "SnapshotHolder":
+        """
+        Primera carga (síncrona) y comprobaciones periódicas en segundo plano.
+        Si la primera carga falla, se sigue sin snapshot (Cypher) y se reintenta.
+        """
+        try:
+            self.refresh()
+        except Exception:
+            log.exception("No se pudo cargar el snapshot de %s", self.root)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="snapshot", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.check_every):
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("No se pudo cargar el snapshot de %s", self.root)
+
+
+def export_from_neo4j(root: str) -> str:
+    from .neo4j_search import DB, catalog_version, driver
+
+    # se lee antes de exportar: si el grafo cambia a mitad, el snapshot queda
+    # marcado con la versión anterior y se ignora
+    live = catalog_version()
+    with driver.session(database=DB) as session:
+        rows = (r.data() for r in session.run(EXPORT_CYPHER, taxonomy=TAXONOMY_VERSION))
+        version = write_snapshot(rows, root, catalog_version=live)
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot del catálogo de SpotifAI.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="exporta el catálogo de Neo4j y activa la nueva versión")
+    exp.add_argument("--out", default=os.getenv("SPOTIFAI_SNAPSHOT_DIR", "snapshots"))
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+    version = export_from_neo4j(args.out)
+    snap = CatalogSnapshot(os.path.join(args.out, version))
+    print(f"✅ Snapshot {version}: {len(snap)} canciones en {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
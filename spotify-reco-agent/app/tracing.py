@@ -0,0 +1,260 @@
+# app/tracing.py
+"""
+Trazas ligeras por etapa para chat_with_agent y las consultas a Neo4j.
+
+- `span("etapa", **attrs)` mide un bloque; si el tracing está desactivado
+  devuelve un objeto vacío compartido (coste casi nulo).
+- `traced_request("chat")` decora la función raíz de una petición y escribe
+  en el log de peticiones lentas (SPOTIFAI_SLOW_LOG o stderr) las que
+  superan SPOTIFAI_SLOW_MS, con sus argumentos por nombre en `attrs`.
+- `prometheus_text()` expone los histogramas en formato Prometheus y, si está
+  instalado `opentelemetry` y SPOTIFAI_OTEL=1, cada span se emite también
+  como span de OpenTelemetry.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# Se importa antes que neo4j_search/agent: cargar .env aquí para que
+# SPOTIFAI_TRACING y compañía no dependan del orden de los imports.
+load_dotenv()
+
+ENABLED = os.getenv("SPOTIFAI_TRACING", "0") == "1"
+SLOW_REQUEST_MS = float(os.getenv("SPOTIFAI_SLOW_MS", "2000"))
+
+# Límites de los histogramas, en segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+slow_log = logging.getLogger("spotifai.slow")
+if os.getenv("SPOTIFAI_SLOW_LOG"):
+    # una línea JSON por petición lenta
+    _handler = logging.FileHandler(os.getenv("SPOTIFAI_SLOW_LOG"), encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_log.addHandler(_handler)
+
+_current = contextvars.ContextVar("spotifai_trace", default=None)
+_metrics_lock = threading.Lock()
+_metrics = {}  # nombre -> [count, sum, [cuenta por bucket]]
+_otel_tracer = None
+
+
+def configure(enabled: bool | None = None, slow_ms: float | None = None, otel: bool | None = None):
+    """
+    Activa/desactiva el tracing en caliente (útil en benchmarks y scripts).
+    """
+    global ENABLED, SLOW_REQUEST_MS, _otel_tracer
+    if enabled is not None:
+        ENABLED = enabled
+    if slow_ms is not None:
+        SLOW_REQUEST_MS = slow_ms
+    if otel is not None:
+        _otel_tracer = _load_otel_tracer() if otel else None
+
+
+def _load_otel_tracer():
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        return None
+    return otel_trace.get_tracer("spotifai")
+
+
+if os.getenv("SPOTIFAI_OTEL", "0") == "1":
+    _otel_tracer = _load_otel_tracer()
+
+
+def _clean(value):
+    """
+    Hace los atributos serializables y evita volcar vectores enteros al log.
+    """
+    if isinstance(value, (list, tuple)):
+        if len(value) > 16:
+            return f"<list len={len(value)}>"
+        return [_clean(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _clean(v) for k, v in value.items()}
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _observe(name: str, seconds: float):
+    with _metrics_lock:
+        m = _metrics.get(name)
+        if m is None:
+            m = _metrics[name] = [0, 0.0, [0] * len(BUCKETS)]
+        m[0] += 1
+        m[1] += seconds
+        for i, le in enumerate(BUCKETS):
+            if seconds <= le:
+                m[2][i] += 1
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    def __init__(self, name: str, attrs: dict, trace: "Trace | None"):
+        self.name = name
+        self.attrs = attrs
+        self.trace = trace
+        self.duration = 0.0
+        self._otel = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        if _otel_tracer is not None:
+            self._otel = _otel_tracer.start_as_current_span(self.name)
+            self._otel_span = self._otel.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        _observe(self.name, self.duration)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        if self.trace is not None:
+            self.trace.spans.append(self)
+        if self._otel is not None:
+            for k, v in _clean(self.attrs).items():
+                if v is None:
+                    continue
+                if not isinstance(v, (str, int, float, bool)):
+                    v = json.dumps(v, ensure_ascii=False)
+                self._otel_span.set_attribute(k, v)
+            self._otel.__exit__(exc_type, exc, tb)
+        return False
+
+
+class Trace:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.spans: list[Span] = []
+
+    def breakdown(self) -> dict:
+        """
+        Milisegundos por etapa (sumando si una etapa se repite).
+        """
+        out = {}
+        for s in self.spans:
+            out[s.name] = round(out.get(s.name, 0.0) + s.duration * 1000, 2)
+        return out
+
+
+def span(name: str, **attrs):
+    if not ENABLED:
+        return _NOOP
+    return Span(name, attrs, _current.get())
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+def traced_request(name: str):
+    """
+    Decorador para la función raíz de una petición: abre una traza, la cierra
+    y registra la petición en `spotifai.slow` si supera SLOW_REQUEST_MS.
+    """
+    def decorator(fn):
+        sig = inspect.signature(fn)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not ENABLED:
+                    return await fn(*args, **kwargs)
+                trace, token, root = _start_request(name, sig, args, kwargs)
+                try:
+                    with root:
+                        return await fn(*args, **kwargs)
+                finally:
+                    _finish_request(trace, token, root)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            trace, token, root = _start_request(name, sig, args, kwargs)
+            try:
+                with root:
+                    return fn(*args, **kwargs)
+            finally:
+                _finish_request(trace, token, root)
+        return wrapper
+    return decorator
+
+
+def _start_request(name: str, sig: inspect.Signature, args, kwargs):
+    # por nombre y no por posición: chat(app, user_query) y chat_with_agent(user_query)
+    # dejan la consulta en el mismo atributo
+    try:
+        attrs = dict(sig.bind_partial(*args, **kwargs).arguments)
+    except TypeError:
+        attrs = {"args": list(args), **kwargs}
+    trace = Trace(name, _clean(attrs))
+    token = _current.set(trace)
+    return trace, token, Span(name, {}, None)
+
+
+def _finish_request(trace: Trace, token, root: Span):
+    _current.reset(token)
+    total_ms = root.duration * 1000
+    if total_ms >= SLOW_REQUEST_MS:
+        slow_log.warning(json.dumps({
+            "request": trace.name,
+            "total_ms": round(total_ms, 2),
+            "attrs": trace.attrs,
+            "stages": trace.breakdown(),
+            "spans": [
+                {"name": s.name, "ms": round(s.duration * 1000, 2), **_clean(s.attrs)}
+                for s in trace.spans
+            ],
+        }, ensure_ascii=False))
+
+
+def prometheus_text() -> str:
+    """
+    Histogramas por etapa en formato de exposición de Prometheus.
+    """
+    lines = [
+        "# HELP spotifai_stage_duration_seconds Duración de cada etapa de la petición.",
+        "# TYPE spotifai_stage_duration_seconds histogram",
+    ]
+    with _metrics_lock:
+        snapshot = {k: (c, s, list(b)) for k, (c, s, b) in _metrics.items()}
+    for name, (count, total, buckets) in sorted(snapshot.items()):
+        for le, n in zip(BUCKETS, buckets):
+            lines.append(f'spotifai_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {n}')
+        lines.append(f'spotifai_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'spotifai_stage_duration_seconds_sum{{stage="{name}"}} {total:.6f}')
+        lines.append(f'spotifai_stage_duration_seconds_count{{stage="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
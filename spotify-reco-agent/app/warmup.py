@@ -0,0 +1,140 @@
+# app/warmup.py
+"""
+Calentamiento y respuestas precalculadas para las peticiones más frecuentes.
+
+Al arrancar (y luego cada SPOTIFAI_WARMUP_INTERVAL segundos) se comprueba si
+ha cambiado la versión del catálogo (la que suben scripts/graph.py y
+scripts/embed_tracks.py) o la del snapshot; si es así, o si las entradas
+superan SPOTIFAI_WARMUP_MAX_AGE, se recalculan en segundo plano el vector,
+los candidatos y la respuesta completa de cada petición caliente.
+
+    python -m app.warmup          # una pasada, mostrando tiempos
+"""
+import logging
+import os
+import threading
+import time
+
+from . import agent, neo4j_search
+
+HOT_PROMPTS_FILE = os.getenv("SPOTIFAI_HOT_PROMPTS", "")
+INTERVAL = float(os.getenv("SPOTIFAI_WARMUP_INTERVAL", "300"))
+MAX_AGE = float(os.getenv("SPOTIFAI_WARMUP_MAX_AGE", "3600"))
+
+log = logging.getLogger("spotifai.warmup")
+
+# Ejemplos del sidebar de streamlit_app.py: siempre se precalculan
+EXAMPLE_PROMPTS = [
+    "Quiero música tranquila para relajarme después de un día largo",
+    "Dame 5 canciones pop muy conocidas",
+    "Me gusta Coldplay y Keane, recomiéndame algo parecido",
+    "Quiero música para estudiar sin distraerme",
+    "Basándote en mis gustos, sorpréndeme",
+]
+
+
+def load_hot_prompts(path: str = HOT_PROMPTS_FILE) -> list[str]:
+    """
+    Peticiones calientes extra (una por línea) además de las del sidebar.
+    """
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def fingerprint() -> tuple:
+    # encoder y modelo de Ollama se leen al importar: solo cambian al reiniciar
+    return neo4j_search.catalog_stamp()
+
+
+class Warmup:
+    def __init__(self, prompts: list[str], interval: float = INTERVAL, max_age: float = MAX_AGE):
+        # sin duplicados y conservando el orden
+        self.prompts = list(dict.fromkeys(p.strip() for p in prompts if p.strip()))
+        self.interval = interval
+        self.max_age = max_age
+        self.last_fingerprint = None
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Recalcula las cachés si algo ha cambiado. Devuelve True si lo ha hecho.
+        """
+        with self._lock:
+            fp = fingerprint()
+            fresh = time.monotonic() - self.last_refresh < self.max_age
+            if not force and fp == self.last_fingerprint and fresh:
+                return False
+
+            vectors, results, answers = {}, {}, {}
+            for prompt in self.prompts:
+                try:
+                    self._precompute(prompt, vectors, results, answers)
+                except Exception:
+                    log.exception("No se pudo precalcular %r", prompt)
+
+            # publicar de golpe: las peticiones ven las cachés viejas o las nuevas
+            neo4j_search.hot_vectors = vectors
+            neo4j_search.hot_results = results
+            agent.hot_answers = answers
+            self.last_fingerprint = fp
+            self.last_refresh = time.monotonic()
+            return True
+
+    def _precompute(self, prompt: str, vectors: dict, results: dict, answers: dict):
+        if len(prompt) < 4:
+            return
+        # mismos parámetros que usa chat_with_agent con k=None
+        k_effective = agent.parse_num_songs_from_query(prompt)
+        genre = agent.detect_genre(prompt)
+        k_search = agent.search_k(k_effective)
+
+        q_vec = neo4j_search.get_embed_model().encode(prompt).tolist()
+        raw = neo4j_search.search_by_vector(q_vec, k=k_search, genre_filter=genre)
+
+        vectors[prompt] = q_vec
+        results[(prompt, k_search, genre)] = raw
+        answers[agent.hot_key(prompt, None)] = agent.answer_query(prompt, None, raw=[dict(r) for r in raw])
+
+    def start(self) -> "Warmup":
+        """
+        Primera pasada y refrescos periódicos en un hilo en segundo plano.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.refresh():
+                    log.info("Calentadas %d peticiones", len(agent.hot_answers))
+            except Exception:
+                log.exception("Fallo en el calentamiento")
+            self._stop.wait(self.interval)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    warmup = Warmup(EXAMPLE_PROMPTS + load_hot_prompts())
+
+    start = time.perf_counter()
+    warmup.refresh(force=True)
+    print(f"✅ {len(agent.hot_answers)} respuestas precalculadas en {time.perf_counter() - start:.1f}s")
+
+    for prompt in warmup.prompts:
+        t0 = time.perf_counter()
+        agent.chat_with_agent(prompt)
+        print(f"{(time.perf_counter() - t0) * 1000:8.2f} ms  {prompt}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# bench/fakes.py
+"""
+Sustitutos locales de Neo4j, Ollama y el modelo de embeddings para medir
+`chat_with_agent` sin servicios externos.
+"""
+import random
+import re
+import time
+import zlib
+
+import numpy as np
+
+from app.genres import matches_genre
+
+EMBEDDING_DIM = 512
+
+GENRES = [
+    "pop", "dance pop", "rock", "indie rock", "indie", "latin", "reggaeton",
+    "acoustic", "metal", "jazz", "hip hop", "rap", "lofi", "ambient", "chill",
+    "classical", "soul", "edm", "techno", "korean", "j-pop", "anime", "world",
+]
+
+WORDS_ES = ["amor", "noche", "luz", "mar", "fuego", "camino", "sueño", "ciudad", "verano", "corazón"]
+WORDS_EN = ["love", "night", "light", "ocean", "fire", "road", "dream", "city", "summer", "heart"]
+WORDS_OTHER = ["사랑", "夜の街", "Путь", "حب", "夢"]
+
+
+def build_catalog(n_tracks: int = 20000, n_artists: int = 2000, seed: int = 0) -> dict:
+    """
+    Catálogo sintético: canciones con artista, géneros, popularidad y
+    embeddings normalizados (misma dimensión que distiluse).
+    """
+    rnd = random.Random(seed)
+    artists = []
+    for i in range(n_artists):
+        words = WORDS_OTHER if rnd.random() < 0.05 else rnd.choice([WORDS_ES, WORDS_EN])
+        artists.append({
+            "name": f"{rnd.choice(words).title()} {rnd.choice(words).title()} {i}",
+            "genres": rnd.sample(GENRES, rnd.randint(1, 3)),
+        })
+
+    tracks = []
+    for i in range(n_tracks):
+        a = artists[rnd.randrange(n_artists)]
+        words = WORDS_OTHER if rnd.random() < 0.05 else rnd.choice([WORDS_ES, WORDS_EN])
+        tracks.append({
+            "id": f"track{i}",
+            "title": " ".join(rnd.choice(words) for _ in range(rnd.randint(1, 4))).capitalize(),
+            "artist": a["name"],
+            "genres": a["genres"],
+            "popularity": rnd.randint(0, 100),
+        })
+
+    vecs = np.random.default_rng(seed).standard_normal((n_tracks, EMBEDDING_DIM)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return {"tracks": tracks, "embeddings": vecs}
+
+
+class FakeEncoder:
+    """
+    Embeddings deterministas por texto (sin cargar ningún modelo).
+    """
+    def encode(self, text, **kwargs):
+        if isinstance(text, (list, tuple)):
+            return np.stack([self.encode(t) for t in text])
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        v = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+        return v / np.linalg.norm(v)
+
+
+class FakeResult:
+    def __init__(self, rows: list[dict]):
+        self._rows = rows
+
+    def data(self):
+        return self._rows
+
+    def single(self):
+        return self._rows[0] if self._rows else None
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, cypher, parameters=None, **params):
+        params = {**(parameters or {}), **params}
+        if "db.index.vector.queryNodes" in cypher and "k" in params:
+            return FakeResult(self._driver.vector_query(params["vec"], params["k"], params.get("genre", "")))
+        if "db.index.vector.queryNodes" in cypher:
+            # SEARCH_IDS_CYPHER: solo id y score de los n más cercanos
+            return FakeResult(self._driver.vector_ids(params["vec"], params["n"]))
+        if "CatalogVersion" in cypher:
+            return FakeResult([{"version": 1}])
+        if "UNWIND $ids" in cypher:
+            return FakeResult(self._driver.hydrate(params["ids"]))
+        raise NotImplementedError("FakeDriver solo soporta las consultas de search_similar_tracks")
+
+
+class FakeDriver:
+    """
+    Imita `GraphDatabase.driver` para la consulta de `search_similar_tracks`:
+    top-(k*2) por similitud coseno, filtro de género y LIMIT k.
+    """
+    def __init__(self, catalog: dict, query_latency: float = 0.0):
+        self.catalog = catalog
+        self.query_latency = query_latency
+        self.by_id = {t["id"]: t for t in catalog["tracks"]}
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+    def close(self):
+        pass
+
+    def _nearest(self, vec, n: int):
+        if self.query_latency:
+            time.sleep(self.query_latency)
+        emb = self.catalog["embeddings"]
+        q = np.asarray(vec, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        cos = emb @ q
+        n = min(n, len(cos))
+        top = np.argpartition(-cos, n - 1)[:n]
+        top = top[np.argsort(-cos[top])]
+        # Neo4j normaliza el coseno a [0, 1]
+        return [(int(i), float((1 + cos[i]) / 2)) for i in top]
+
+    def vector_query(self, vec, k: int, genre: str = "") -> list[dict]:
+        rows = []
+        for i, score in self._nearest(vec, k * 2):
+            t = self.catalog["tracks"][i]
+            if not matches_genre(t, genre):
+                continue
+            rows.append({**t, "score": score})
+            if len(rows) >= k:
+                break
+        return rows
+
+    def vector_ids(self, vec, n: int) -> list[dict]:
+        return [{"id": self.catalog["tracks"][i]["id"], "score": score} for i, score in self._nearest(vec, n)]
+
+    def hydrate(self, ids: list[str]) -> list[dict]:
+        return [dict(self.by_id[tid]) for tid in ids if tid in self.by_id]
+
+
+class FakeCompletion:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeLLM:
+    """
+    Cliente de Ollama con latencia configurable (media ± jitter, en segundos).
+    """
+    def __init__(self, latency: float = 0.8, jitter: float = 0.2, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self._rnd = random.Random(seed)
+
+    def complete(self, prompt: str, **kwargs):
+        time.sleep(max(0.0, self.latency + self._rnd.uniform(-self.jitter, self.jitter)))
+        m = re.search(r"Estilos presentes: (.+)", prompt)
+        styles = m.group(1).strip() if m else "varios estilos"
+        return FakeCompletion(
+            f"Son temas con un sonido cercano a {styles}. "
+            "Tienen un ritmo fácil de seguir y encajan bien con el momento que describes."
+        )
@@ -0,0 +1,274 @@
+# bench/replay.py
+"""
+Reproducción offline de un conjunto de consultas para comparar variantes de
+recuperación: calidad (recall@k frente a búsqueda exacta), supervivencia a
+los filtros de chat_with_agent y consultas/segundo con un pool de procesos.
+
+Variantes:
+    exact        fuerza bruta float32 sobre todos los embeddings (referencia)
+    int8         fuerza bruta sobre embeddings cuantizados a int8 por dimensión
+    index:F      índice vectorial de Neo4j pidiendo k*F candidatos (F=2 es lo actual)
+
+Uso (desde spotify-reco-agent/):
+    python -m bench.replay --queries bench/prompts.txt --variants exact int8 index:1 index:2 index:4
+    python -m bench.replay --queries slow_requests.log --neo4j real --workers 8
+
+Las consultas pueden venir en texto plano (una por línea) o en JSONL, ya sea
+{"query": ...} o líneas del log de peticiones lentas de app/tracing.py.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.genres import matches_genre
+
+from . import fakes
+from .run_bench import BENCH_DIR
+
+CATALOG_CYPHER = """
+MATCH (t:Track)
+WHERE t.embedding IS NOT NULL
+OPTIONAL MATCH (t)-[:BY_ARTIST]->(a:Artist)
+OPTIONAL MATCH (t)-[:HAS_GENRE]->(g:Genre)
+WITH t, head(collect(DISTINCT a.name)) AS artist, collect(DISTINCT g.name) AS genres
+RETURN t.id AS id, t.title AS title, coalesce(artist, '') AS artist, genres,
+       t.popularity AS popularity, t.embedding AS embedding
+"""
+
+
+def load_queries(path: str) -> list[str]:
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                rec = json.loads(line)
+                q = rec.get("query") or rec.get("attrs", {}).get("user_query")
+                if q:
+                    queries.append(q)
+            else:
+                queries.append(line)
+    return queries
+
+
+def open_driver():
+    """
+    Driver propio: el proceso principal y cada proceso del pool abren el suyo.
+    """
+    from neo4j import GraphDatabase
+    from app.neo4j_search import PASS, URI, USER
+    return GraphDatabase.driver(URI, auth=(USER, PASS), encrypted=False)
+
+
+def catalog_version():
+    from app.neo4j_search import CATALOG_VERSION_CYPHER, DB
+    with open_driver() as driver, driver.session(database=DB) as session:
+        rec = session.run(CATALOG_VERSION_CYPHER).single()
+    return rec["version"] if rec else None
+
+
+def build_cache(cache_dir: str, neo4j: str, catalog_size: int, seed: int):
+    """
+    Guarda embeddings (float32 normalizados) y metadatos del catálogo una sola
+    vez; los procesos del pool los abren con mmap.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    emb_path = os.path.join(cache_dir, "embeddings.npy")
+    meta_path = os.path.join(cache_dir, "tracks.json")
+    if os.path.exists(emb_path) and os.path.exists(meta_path):
+        return
+
+    if neo4j == "fake":
+        catalog = fakes.build_catalog(catalog_size, seed=seed)
+        tracks, emb = catalog["tracks"], catalog["embeddings"]
+    else:
+        from app.neo4j_search import DB
+        tracks, vecs = [], []
+        with open_driver() as driver, driver.session(database=DB) as session:
+            for r in session.run(CATALOG_CYPHER):
+                row = r.data()
+                vecs.append(row.pop("embedding"))
+                tracks.append(row)
+        emb = np.asarray(vecs, dtype=np.float32)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+
+    np.save(emb_path, emb)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(tracks, f, ensure_ascii=False)
+
+
+# ------------------------------------------------------------------
+# Estado de cada proceso del pool
+# ------------------------------------------------------------------
+_w = {}
+
+
+def _init_worker(cache_dir: str, neo4j: str):
+    from app import agent, neo4j_search
+
+    emb = np.load(os.path.join(cache_dir, "embeddings.npy"), mmap_mode="r")
+    with open(os.path.join(cache_dir, "tracks.json"), encoding="utf-8") as f:
+        tracks = json.load(f)
+
+    # int8 simétrico por dimensión; se guarda ya descuantizado para medir calidad
+    scale = np.abs(emb).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    q8 = np.round(np.asarray(emb) / scale).astype(np.int8)
+
+    if neo4j == "fake":
+        neo4j_search.driver = fakes.FakeDriver({"tracks": tracks, "embeddings": np.asarray(emb)})
+    else:
+        neo4j_search.driver = open_driver()
+
+    _w.update(
+        agent=agent,
+        neo4j_search=neo4j_search,
+        tracks=tracks,
+        by_id={t["id"]: t for t in tracks},
+        emb=emb,
+        emb_int8=q8.astype(np.float32) * scale,
+    )
+
+
+def _brute_force(matrix, q_vec: np.ndarray, k: int, genre: str) -> list[dict]:
+    scores = matrix @ q_vec
+    rows = []
+    # primero un corte amplio; si el filtro de género deja pocos, orden completo
+    for n in (min(len(scores), k * 50), len(scores)):
+        top = np.argpartition(-scores, n - 1)[:n]
+        rows = []
+        for i in top[np.argsort(-scores[top])]:
+            t = _w["tracks"][i]
+            if not matches_genre(t, genre):
+                continue
+            # misma escala que Neo4j (coseno normalizado a [0, 1])
+            rows.append({**t, "score": float((1 + scores[i]) / 2)})
+            if len(rows) >= k:
+                return rows
+    return rows
+
+
+def _index_search(q_vec: list[float], k: int, genre: str, factor: float) -> list[dict]:
+    ns = _w["neo4j_search"]
+    with ns.driver.session(database=ns.DB) as session:
+        hits = session.run(ns.SEARCH_IDS_CYPHER, vec=q_vec, n=max(1, int(k * factor))).data()
+    found = {h["id"]: _w["by_id"][h["id"]] for h in hits if h["id"] in _w["by_id"]}
+    return ns._merge_hits(hits, found, k, genre)
+
+
+def run_query(job: tuple) -> dict:
+    variant, query, q_vec = job
+    agent = _w["agent"]
+
+    cleaned = query.strip()
+    k_effective = agent.parse_num_songs_from_query(cleaned)
+    genre = agent.detect_genre(cleaned)
+    k_search = agent.search_k(k_effective)
+
+    start = time.perf_counter()
+    if variant == "exact":
+        raw = _brute_force(_w["emb"], np.asarray(q_vec, dtype=np.float32), k_search, genre)
+    elif variant == "int8":
+        raw = _brute_force(_w["emb_int8"], np.asarray(q_vec, dtype=np.float32), k_search, genre)
+    else:
+        raw = _index_search(q_vec, k_search, genre, float(variant.split(":", 1)[1]))
+    retrieval_s = time.perf_counter() - start
+
+    kept = agent.filter_by_language_and_genre(cleaned, raw) if raw else []
+    final = agent.rank_candidates(cleaned, raw, k_effective) if raw else []
+    return {
+        "retrieved": [r["id"] for r in raw],
+        "final": [r["id"] for r in final],
+        "survival": len(kept) / len(raw) if raw else 0.0,
+        "filled": len(final) >= k_effective,
+        "retrieval_ms": retrieval_s * 1000,
+        "total_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def recall(got: list[str], ref: list[str]) -> float:
+    if not ref:
+        return 1.0
+    return len(set(got) & set(ref)) / len(ref)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara variantes de recuperación sobre consultas registradas.")
+    parser.add_argument("--queries", default=os.path.join(BENCH_DIR, "prompts.txt"))
+    parser.add_argument("--variants", nargs="+", default=["exact", "int8", "index:1", "index:2", "index:4"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--neo4j", choices=["fake", "real"], default="fake")
+    parser.add_argument("--encoder", choices=["fake", "real"], default="real")
+    parser.add_argument("--catalog-size", type=int, default=20000, help="solo con --neo4j fake")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=os.path.join(BENCH_DIR, "results", "replay-cache"))
+    parser.add_argument("--out", default=None, help="fichero JSON con el resumen")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    if args.neo4j == "fake":
+        cache_dir = os.path.join(args.cache_dir, f"fake-{args.catalog_size}-{args.seed}")
+    else:
+        # la caché solo vale para una versión del catálogo (scripts/schema.py bump_catalog_version)
+        version = catalog_version()
+        if version is None:
+            cache_dir = tempfile.mkdtemp(prefix="replay-neo4j-")
+        else:
+            cache_dir = os.path.join(args.cache_dir, f"neo4j-v{version}")
+    build_cache(cache_dir, args.neo4j, args.catalog_size, args.seed)
+
+    if args.encoder == "fake":
+        encoder = fakes.FakeEncoder()
+    else:
+        from app.encoders import load_encoder
+        encoder = load_encoder()
+    # los vectores se calculan una vez y se comparten entre variantes
+    vecs = [np.asarray(encoder.encode(q), dtype=np.float32).tolist() for q in queries]
+
+    variants = ["exact"] + [v for v in args.variants if v != "exact"]
+    results = {}
+    # spawn: los procesos no heredan sockets ni hilos del driver o del encoder del padre
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(cache_dir, args.neo4j)) as pool:
+        # arrancar los procesos antes de medir
+        list(pool.map(len, [[]] * args.workers))
+        for variant in variants:
+            jobs = [(variant, q, v) for q, v in zip(queries, vecs)]
+            start = time.perf_counter()
+            rows = list(pool.map(run_query, jobs, chunksize=max(1, len(jobs) // (args.workers * 4))))
+            results[variant] = {"rows": rows, "wall_s": time.perf_counter() - start}
+
+    ref = results["exact"]["rows"]
+    summary = {}
+    print(f"{'variante':<10}{'recall@k':>10}{'final@k':>9}{'superv.':>9}{'llenas':>8}{'ret p50':>9}{'q/s':>9}")
+    for variant in variants:
+        rows, wall = results[variant]["rows"], results[variant]["wall_s"]
+        ret_ms = sorted(r["retrieval_ms"] for r in rows)
+        s = {
+            "recall_at_k": float(np.mean([recall(r["retrieved"], e["retrieved"]) for r, e in zip(rows, ref)])),
+            "final_recall": float(np.mean([recall(r["final"], e["final"]) for r, e in zip(rows, ref)])),
+            "filter_survival": float(np.mean([r["survival"] for r in rows])),
+            "filled_rate": float(np.mean([r["filled"] for r in rows])),
+            "retrieval_p50_ms": ret_ms[len(ret_ms) // 2],
+            "qps": len(rows) / wall,
+        }
+        summary[variant] = s
+        print(f"{variant:<10}{s['recall_at_k']:>10.3f}{s['final_recall']:>9.3f}{s['filter_survival']:>9.2f}"
+              f"{s['filled_rate']:>8.2f}{s['retrieval_p50_ms']:>9.1f}{s['qps']:>9.1f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"queries": len(queries), "config": vars(args), "variants": summary}, f, indent=2)
+        print(f"\nResumen guardado en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
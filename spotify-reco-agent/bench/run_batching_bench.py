@@ -0,0 +1,74 @@
+# bench/run_batching_bench.py
+"""
+Throughput de `encode` con N clientes concurrentes: una petición cada vez
+frente al micro-batcher de app/batching.py.
+
+    python -m bench.run_batching_bench --clients 1 8 32 --requests 256
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.batching import EncodeBatcher
+
+from .run_bench import BENCH_DIR, load_prompts
+
+
+async def one_at_a_time(model, texts: list[str], clients: int) -> float:
+    # un solo hilo para el modelo, como el batcher, pero sin agrupar
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(clients)
+
+    async def client(text):
+        async with sem:
+            await loop.run_in_executor(executor, model.encode, text)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(t) for t in texts))
+    executor.shutdown()
+    return time.perf_counter() - start
+
+
+async def batched(model, texts: list[str], clients: int, max_batch: int, max_wait_ms: float) -> float:
+    batcher = EncodeBatcher(lambda: model, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    sem = asyncio.Semaphore(clients)
+
+    async def client(text):
+        async with sem:
+            await batcher.encode(text)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(t) for t in texts))
+    batcher.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput de encode con y sin micro-batching.")
+    parser.add_argument("--prompts", default=os.path.join(BENCH_DIR, "prompts.txt"))
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    from app.neo4j_search import get_embed_model
+    model = get_embed_model()
+
+    prompts = load_prompts(args.prompts)
+    texts = [prompts[i % len(prompts)] + f" #{i}" for i in range(args.requests)]
+    model.encode(texts[:4])  # calentamiento
+
+    print(f"{'clientes':>9}{'1 a 1 (req/s)':>16}{'batch (req/s)':>16}{'x':>7}")
+    for clients in args.clients:
+        t_single = asyncio.run(one_at_a_time(model, texts, clients))
+        t_batch = asyncio.run(batched(model, texts, clients, args.max_batch, args.max_wait_ms))
+        rps_single, rps_batch = len(texts) / t_single, len(texts) / t_batch
+        print(f"{clients:>9}{rps_single:>16.1f}{rps_batch:>16.1f}{rps_batch / rps_single:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# bench/run_bench.py
+"""
+Benchmark de latencia de extremo a extremo de `chat_with_agent`.
+
+Uso (desde spotify-reco-agent/):
+    python -m bench.run_bench --users 1 4 8 --repeat 3
+    python -m bench.run_bench --neo4j real --llm real --encoder real
+    python -m bench.run_bench --compare bench/results/anterior.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from . import fakes
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ["embed", "vector_query", "search", "filter", "rerank", "diversify", "llm", "total"]
+
+_local = threading.local()
+
+
+def _add(stage: str, elapsed: float):
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def timed(stage: str, fn):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _add(stage, time.perf_counter() - start)
+    return wrapper
+
+
+class TimedProxy:
+    """
+    Envuelve un objeto y cronometra uno de sus métodos (encode, complete, session...).
+    """
+    def __init__(self, target, method: str, stage: str):
+        self._target = target
+        self._method = method
+        self._stage = stage
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name == self._method:
+            return timed(self._stage, attr)
+        return attr
+
+
+class TimedSession:
+    """
+    Cronometra `run()` y la lectura de filas (el driver real es perezoso).
+    """
+    def __init__(self, session):
+        self._session = session
+
+    def __enter__(self):
+        self._session.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._session.__exit__(*exc)
+
+    def run(self, *args, **kwargs):
+        result = timed("vector_query", self._session.run)(*args, **kwargs)
+        return TimedProxy(result, "data", "vector_query")
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class TimedDriver:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def session(self, **kwargs):
+        return TimedSession(self._driver.session(**kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+def load_prompts(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def setup_pipeline(args):
+    """
+    Sustituye los backends pedidos y cronometra cada etapa de chat_with_agent.
+    """
+    from app import agent, neo4j_search
+
+    if args.encoder == "fake":
+        neo4j_search.embed_model = fakes.FakeEncoder()
+    neo4j_search.embed_model = TimedProxy(neo4j_search.get_embed_model(), "encode", "embed")
+
+    if args.neo4j == "fake":
+        catalog = fakes.build_catalog(args.catalog_size, seed=args.seed)
+        neo4j_search.driver = fakes.FakeDriver(catalog, query_latency=args.query_latency)
+    neo4j_search.driver = TimedDriver(neo4j_search.driver)
+
+    if args.llm == "fake":
+        agent.llm = fakes.FakeLLM(args.llm_latency, args.llm_jitter, seed=args.seed)
+    agent.llm = TimedProxy(agent.llm, "complete", "llm")
+
+    agent.search_similar_tracks = timed("search", agent.search_similar_tracks)
+    agent.filter_by_language_and_genre = timed("filter", agent.filter_by_language_and_genre)
+    agent.calm_score = timed("rerank", agent.calm_score)
+    agent.limit_tracks_per_artist = timed("diversify", agent.limit_tracks_per_artist)
+    return agent.chat_with_agent
+
+
+def run_one(chat, prompt: str) -> dict:
+    _local.timings = {}
+    start = time.perf_counter()
+    try:
+        chat(prompt)
+    finally:
+        _local.timings["total"] = time.perf_counter() - start
+        timings, _local.timings = _local.timings, None
+    return timings
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))
+    return values[idx]
+
+
+def summarize(samples: list[dict]) -> dict:
+    out = {}
+    for stage in STAGES:
+        values = [s[stage] * 1000 for s in samples if stage in s]
+        if not values:
+            continue
+        out[stage] = {
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "mean_ms": round(sum(values) / len(values), 2),
+        }
+    return out
+
+
+def run_level(chat, prompts: list[str], users: int, repeat: int) -> dict:
+    work = prompts * repeat
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        samples = list(pool.map(lambda p: run_one(chat, p), work))
+    wall = time.perf_counter() - start
+    return {
+        "users": users,
+        "requests": len(work),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(work) / wall, 2),
+        "stages": summarize(samples),
+    }
+
+
+def print_level(level: dict, baseline: dict | None = None):
+    print(f"\n== {level['users']} usuarios: {level['requests']} peticiones, "
+          f"{level['throughput_rps']} req/s")
+    print(f"{'etapa':<14}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, st in level["stages"].items():
+        line = f"{stage:<14}{st['p50_ms']:>10.1f}{st['p95_ms']:>10.1f}{st['p99_ms']:>10.1f}"
+        base = (baseline or {}).get("stages", {}).get(stage)
+        if base and base["p95_ms"]:
+            delta = (st["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+            line += f"   p95 {delta:+.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latencia de chat_with_agent.")
+    parser.add_argument("--prompts", default=os.path.join(BENCH_DIR, "prompts.txt"))
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 8], help="niveles de concurrencia")
+    parser.add_argument("--repeat", type=int, default=3, help="veces que se repite el corpus por nivel")
+    parser.add_argument("--warmup", type=int, default=3, help="peticiones de calentamiento (no se miden)")
+    parser.add_argument("--neo4j", choices=["fake", "real"], default="fake")
+    parser.add_argument("--llm", choices=["fake", "real"], default="fake")
+    parser.add_argument("--encoder", choices=["fake", "real"], default="real")
+    parser.add_argument("--catalog-size", type=int, default=20000)
+    parser.add_argument("--query-latency", type=float, default=0.0, help="latencia extra del Neo4j falso (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="latencia media del Ollama falso (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="fichero JSON de resultados")
+    parser.add_argument("--compare", default=None, help="JSON de una ejecución anterior para comparar p95")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.prompts)
+    chat = setup_pipeline(args)
+
+    for p in prompts[:args.warmup]:
+        run_one(chat, p)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {lvl["users"]: lvl for lvl in json.load(f)["levels"]}
+
+    levels = []
+    for users in args.users:
+        level = run_level(chat, prompts, users, args.repeat)
+        print_level(level, baseline.get(users))
+        levels.append(level)
+
+    result = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in {"out", "compare"}},
+        "levels": levels,
+    }
+    out = args.out or os.path.join(
+        BENCH_DIR, "results", f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# bench/run_encoder_bench.py
+"""
+Paridad, latencia y memoria de los backends de app/encoders.py.
+
+Cada backend se carga en un subproceso aparte (memoria limpia) y sus
+embeddings se comparan con los del modelo PyTorch de referencia:
+
+    python -m bench.run_encoder_bench --backends quantized onnx onnx-int8
+
+Sale con código 1 si algún backend baja de --min-cosine en algún texto.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .run_bench import BENCH_DIR, load_prompts, percentile
+
+# Descripciones con el mismo formato que scripts/embed_tracks.py
+TRACK_DESCRIPTIONS = [
+    "Yellow by Coldplay. Genres: pop, rock. Energy 0.6, danceability 0.43, "
+    "acousticness 0.0, valence 0.28, tempo 173.4 BPM.",
+    "Despacito by Luis Fonsi. Genres: latin, reggaeton. Energy 0.8, danceability 0.66, "
+    "acousticness 0.2, valence 0.84, tempo 178.0 BPM.",
+    "Weightless by Marconi Union. Genres: ambient. Energy 0.1, danceability 0.2, "
+    "acousticness 0.9, valence 0.1, tempo 70.0 BPM.",
+    "Master of Puppets by Metallica. Genres: metal. Energy 0.97, danceability 0.4, "
+    "acousticness 0.0, valence 0.5, tempo 212.0 BPM.",
+    "Tu canción by Amaia. Genres: sin género. Energy None, danceability None, "
+    "acousticness None, valence None, tempo None BPM.",
+]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def worker(backend: str, texts: list[str], out_path: str, repeat: int):
+    from app.encoders import load_encoder
+
+    base = rss_mb()
+    start = time.perf_counter()
+    model = load_encoder(backend)
+    load_s = time.perf_counter() - start
+    model.encode(texts[:2])  # calentamiento
+
+    single = []
+    for _ in range(repeat):
+        for t in texts:
+            t0 = time.perf_counter()
+            model.encode(t)
+            single.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    embs = np.asarray(model.encode(texts, batch_size=32), dtype=np.float32)
+    batch_s = time.perf_counter() - t0
+
+    np.save(out_path, embs)
+    print(json.dumps({
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "rss_mb": round(rss_mb() - base, 1),
+        "p50_ms": round(percentile(single, 50), 2),
+        "p95_ms": round(percentile(single, 95), 2),
+        "batch_per_text_ms": round(batch_s / len(texts) * 1000, 2),
+    }))
+
+
+def run_backend(backend: str, texts_path: str, out_path: str, repeat: int) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-m", "bench.run_encoder_bench", "--worker", backend,
+         "--texts", texts_path, "--emb-out", out_path, "--repeat", str(repeat)],
+        capture_output=True, text=True, cwd=os.path.dirname(BENCH_DIR),
+    )
+    if proc.returncode != 0:
+        return {"backend": backend, "error": proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y rendimiento de los backends del encoder.")
+    parser.add_argument("--backends", nargs="+", default=["quantized", "onnx", "onnx-int8"])
+    parser.add_argument("--prompts", default=os.path.join(BENCH_DIR, "prompts.txt"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="coseno mínimo aceptado frente a torch")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--texts", help=argparse.SUPPRESS)
+    parser.add_argument("--emb-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.texts, encoding="utf-8") as f:
+            worker(args.worker, json.load(f), args.emb_out, args.repeat)
+        return
+
+    texts = load_prompts(args.prompts) + TRACK_DESCRIPTIONS
+    tmp = tempfile.mkdtemp(prefix="encoder-bench-")
+    texts_path = os.path.join(tmp, "texts.json")
+    with open(texts_path, "w", encoding="utf-8") as f:
+        json.dump(texts, f, ensure_ascii=False)
+
+    results = {}
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        results[backend] = run_backend(backend, texts_path, os.path.join(tmp, f"{backend}.npy"), args.repeat)
+
+    if "error" in results["torch"]:
+        raise SystemExit(f"No se pudo cargar el modelo de referencia: {results['torch']['error']}")
+    ref = np.load(os.path.join(tmp, "torch.npy"))
+
+    ok = True
+    print(f"{'backend':<11}{'p50 ms':>8}{'p95 ms':>8}{'lote ms':>9}{'RSS MB':>8}{'cos medio':>11}{'cos mín':>9}")
+    for backend, r in results.items():
+        if "error" in r:
+            ok = False
+            print(f"{backend:<11} error: {' '.join(r['error'])}")
+            continue
+        cos = cosine_rows(ref, np.load(os.path.join(tmp, f"{backend}.npy")))
+        r["cos_mean"], r["cos_min"] = float(cos.mean()), float(cos.min())
+        if r["cos_min"] < args.min_cosine:
+            ok = False
+        print(f"{backend:<11}{r['p50_ms']:>8.1f}{r['p95_ms']:>8.1f}{r['batch_per_text_ms']:>9.1f}"
+              f"{r['rss_mb']:>8.0f}{r['cos_mean']:>11.4f}{r['cos_min']:>9.4f}")
+
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
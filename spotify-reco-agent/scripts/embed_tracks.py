@@ -1,10 +1,14 @@
 from neo4j import GraphDatabase
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 import os
+import sys
 
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.encoders import load_encoder
+from schema import bump_catalog_version
+
 uri = os.getenv("NEO4J_URI", "neo4j://localhost:7687")
 user = os.getenv("NEO4J_USER", "neo4j")
 password = os.getenv("NEO4J_PASS", "spotify..")
@@ -12,7 +16,8 @@ DB   = os.getenv("NEO4J_DATABASE", "tracks-big")
 
 driver = GraphDatabase.driver(uri, auth=(user, password), encrypted=False)
 
-model = SentenceTransformer("distiluse-base-multilingual-cased-v2")
+# Mismo encoder que usa la búsqueda (SPOTIFAI_ENCODER, por defecto torch)
+model = load_encoder()
 
 def make_description(record: dict) -> str:
     """
@@ -61,4 +66,7 @@ with driver.session(database=DB) as session:
             SET t.embedding = $emb
         """, id=r["id"], emb=emb)
 
+# las respuestas precalculadas de la app dependen de los embeddings
+bump_catalog_version(driver, DB)
+
 print("✅ Embeddings creados y guardados en Neo4j (tracks_big).")
@@ -1,6 +1,19 @@
+import argparse
+import ast
+import csv
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 from neo4j import GraphDatabase
 
+from schema import apply_schema, bump_catalog_version
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.genres import FAMILIES, FAMILY_BITS, TAXONOMY_VERSION, families_of, genre_mask, track_families
+
 URI = os.getenv("NEO4J_URI", "bolt://127.0.0.1:7687")
 USER = os.getenv("NEO4J_USER", "neo4j")
 PASS = os.getenv("NEO4J_PASS", "testtest")
@@ -21,12 +34,8 @@ def ping():
         return False
 
 def init_schema():
-    for q in [
-        "CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
-        "CREATE CONSTRAINT track_id IF NOT EXISTS FOR (t:Track) REQUIRE t.id IS UNIQUE",
-        "CREATE CONSTRAINT artist_id IF NOT EXISTS FOR (a:Artist) REQUIRE a.id IS UNIQUE",
-    ]:
-        run(q)
+    # restricciones e índices versionados en scripts/schema.py
+    return apply_schema(driver, DB)
 
 def upsert_track(t):
     q = """
@@ -40,3 +49,374 @@ def upsert_track(t):
     MERGE (tr)-[:BY_ARTIST]->(ar)
     """
     run(q, t)
+
+
+# ======================================================
+# Carga masiva desde CSV (data/tracks.csv, artists.csv, genres.csv)
+# ======================================================
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+BATCH_SIZE = int(os.getenv("GRAPH_BATCH_SIZE", "5000"))
+AUDIO_FEATURES = ("energy", "danceability", "acousticness", "valence", "tempo")
+
+UPSERT_ARTISTS = """
+UNWIND $rows AS row
+MERGE (a:Artist {id: row.id})
+SET a.name = row.name, a.popularity = row.popularity, a.followers = row.followers
+"""
+
+UPSERT_GENRES = """
+UNWIND $rows AS row
+MERGE (:Genre {name: row.name})
+"""
+
+UPSERT_TRACKS = """
+UNWIND $rows AS row
+MERGE (t:Track {id: row.id})
+SET t.title = row.title, t.popularity = row.popularity,
+    t.energy = row.energy, t.danceability = row.danceability,
+    t.acousticness = row.acousticness, t.valence = row.valence, t.tempo = row.tempo,
+    t.families = row.families, t.family_mask = row.family_mask, t.family_taxonomy = row.family_taxonomy
+"""
+
+LINK_TRACKS = """
+UNWIND $rows AS row
+MATCH (t:Track {id: row.id})
+MATCH (a:Artist {id: row.artist_id})
+MERGE (t)-[:BY_ARTIST]->(a)
+WITH t, row
+UNWIND row.genres AS gname
+MERGE (g:Genre {name: gname})
+MERGE (t)-[:HAS_GENRE]->(g)
+"""
+
+# Taxonomía de app/genres.py: se calcula una vez por nombre de género
+UPSERT_FAMILIES = """
+UNWIND $rows AS row
+MERGE (f:GenreFamily {name: row.name})
+SET f.bit = row.bit
+"""
+
+# Las aristas anteriores se borran: un género puede dejar de estar en una familia
+LINK_GENRE_FAMILIES = """
+UNWIND $rows AS row
+MATCH (g:Genre {name: row.name})
+OPTIONAL MATCH (g)-[old:IN_FAMILY]->(:GenreFamily)
+DELETE old
+WITH DISTINCT g, row
+SET g.families = row.families, g.family_mask = row.family_mask, g.family_taxonomy = row.family_taxonomy
+WITH g, row
+UNWIND row.families AS fname
+MATCH (f:GenreFamily {name: fname})
+MERGE (g)-[:IN_FAMILY]->(f)
+"""
+
+DROP_OLD_FAMILIES = """
+MATCH (f:GenreFamily)
+WHERE NOT f.name IN $names
+DETACH DELETE f
+"""
+
+# Para grafos cargados antes de la taxonomía (o con géneros añadidos a mano)
+BACKFILL_TRACK_FAMILIES = """
+MATCH (t:Track)
+CALL {
+  WITH t
+  OPTIONAL MATCH (t)-[:HAS_GENRE]->(:Genre)-[:IN_FAMILY]->(f:GenreFamily)
+  WITH t, collect(DISTINCT f) AS fams
+  SET t.families = [x IN fams | x.name],
+      t.family_mask = reduce(m = 0, x IN fams | m + x.bit),
+      t.family_taxonomy = $taxonomy
+} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+
+def parse_list(value) -> list[str]:
+    """
+    Las columnas tipo "['pop', 'dance pop']" vienen como texto en los CSV.
+    """
+    if not value:
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return [value.strip()]
+    if isinstance(parsed, str):
+        return [parsed]
+    return [str(x).strip() for x in parsed if str(x).strip()]
+
+
+def to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_chunks(path: str, size: int = BATCH_SIZE):
+    """
+    Lee el CSV en streaming y devuelve listas de como mucho `size` filas.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        while True:
+            chunk = list(islice(reader, size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def artist_row(r: dict) -> dict:
+    return {
+        "id": r["id"],
+        "name": r.get("name") or "",
+        "popularity": to_int(r.get("popularity")),
+        "followers": to_int(r.get("followers")),
+        "genres": parse_list(r.get("genres")),
+    }
+
+
+def track_row(r: dict, artist_genres: dict) -> dict | None:
+    artist_ids = parse_list(r.get("id_artists") or r.get("artist_id"))
+    if not r.get("id") or not artist_ids:
+        return None
+    row = {
+        "id": r["id"],
+        "title": r.get("name") or r.get("title") or "",
+        "popularity": to_int(r.get("popularity")),
+        # Solo el artista principal: las consultas esperan un BY_ARTIST por canción
+        "artist_id": artist_ids[0],
+        "genres": artist_genres.get(artist_ids[0], []),
+    }
+    row["families"] = track_families(row["genres"])
+    row["family_mask"] = genre_mask(row["genres"])
+    row["family_taxonomy"] = TAXONOMY_VERSION
+    for feat in AUDIO_FEATURES:
+        row[feat] = to_float(r.get(feat))
+    return row
+
+
+def write_batch(cypher: str, rows: list[dict]) -> int:
+    # execute_write abre una transacción explícita y reintenta errores transitorios (deadlocks)
+    with driver.session(database=DB) as s:
+        s.execute_write(lambda tx: tx.run(cypher, rows=rows).consume())
+    return len(rows)
+
+
+def load_batches(label: str, cypher: str, batches, workers: int = 1) -> int:
+    """
+    Ejecuta `cypher` sobre cada lote y muestra filas/segundo al terminar.
+    Con workers > 1 se mandan varios lotes en paralelo.
+    """
+    start = time.perf_counter()
+    total = 0
+    if workers <= 1:
+        for rows in batches:
+            total += write_batch(cypher, rows)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for rows in batches:
+                pending.append(pool.submit(write_batch, cypher, rows))
+                # no acumular todo el CSV en memoria
+                if len(pending) >= workers * 2:
+                    total += pending.pop(0).result()
+            for fut in pending:
+                total += fut.result()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"{label}: {total} filas en {elapsed:.1f}s ({total / elapsed:,.0f} filas/s)")
+    return total
+
+
+def load_csv_dir(data_dir: str = DATA_DIR, batch_size: int = BATCH_SIZE, workers: int = 1):
+    """
+    Carga artists.csv, genres.csv y tracks.csv en Neo4j mediante lotes UNWIND.
+    Los géneros de cada canción se toman de su artista principal.
+    """
+    init_schema()
+    start = time.perf_counter()
+    total = 0
+
+    artist_genres = {}
+
+    def artist_batches():
+        for chunk in iter_chunks(os.path.join(data_dir, "artists.csv"), batch_size):
+            rows = [artist_row(r) for r in chunk if r.get("id")]
+            for a in rows:
+                if a["genres"]:
+                    artist_genres[a["id"]] = a.pop("genres")
+                else:
+                    a.pop("genres")
+            yield rows
+
+    total += load_batches("Artist", UPSERT_ARTISTS, artist_batches(), workers)
+
+    genres_path = os.path.join(data_dir, "genres.csv")
+    if os.path.exists(genres_path):
+        def genre_batches():
+            for chunk in iter_chunks(genres_path, batch_size):
+                yield [{"name": name} for r in chunk if (name := (r.get("genres") or r.get("genre") or "").strip())]
+
+        total += load_batches("Genre", UPSERT_GENRES, genre_batches(), workers)
+
+    tracks_path = os.path.join(data_dir, "tracks.csv")
+
+    def track_batches():
+        for chunk in iter_chunks(tracks_path, batch_size):
+            yield [row for r in chunk if (row := track_row(r, artist_genres))]
+
+    total += load_batches("Track", UPSERT_TRACKS, track_batches(), workers)
+    total += load_batches("BY_ARTIST/HAS_GENRE", LINK_TRACKS, track_batches(), workers)
+    total += build_genre_families(batch_size, backfill=False)
+    bump_catalog_version(driver, DB)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Total: {total} filas en {elapsed:.1f}s ({total / elapsed:,.0f} filas/s)")
+
+
+def build_genre_families(batch_size: int = BATCH_SIZE, backfill: bool = True) -> int:
+    """
+    Asigna cada Genre a sus familias (nodos GenreFamily + IN_FAMILY) y, con
+    backfill, recalcula t.families / t.family_mask de todas las canciones.
+    """
+    write_batch(UPSERT_FAMILIES, [{"name": f, "bit": FAMILY_BITS[f]} for f in FAMILIES])
+    run(DROP_OLD_FAMILIES, {"names": FAMILIES})
+
+    names = [r["name"] for r in run("MATCH (g:Genre) RETURN g.name AS name") if r["name"]]
+    rows = [
+        {"name": n, "families": list(families_of(n)), "family_mask": genre_mask([n]),
+         "family_taxonomy": TAXONOMY_VERSION}
+        for n in names
+    ]
+    batches = (rows[i:i + batch_size] for i in range(0, len(rows), batch_size))
+    total = load_batches("IN_FAMILY", LINK_GENRE_FAMILIES, batches)
+
+    if backfill:
+        start = time.perf_counter()
+        with driver.session(database=DB) as s:
+            s.run(BACKFILL_TRACK_FAMILIES, taxonomy=TAXONOMY_VERSION).consume()
+        print(f"Track.families: recalculadas en {time.perf_counter() - start:.1f}s")
+    return total
+
+
+def write_admin_import(data_dir: str = DATA_DIR, out_dir: str = "import", batch_size: int = BATCH_SIZE):
+    """
+    Genera ficheros para `neo4j-admin database import full` (carga en frío,
+    con la base de datos parada y vacía).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    total = 0
+
+    artist_genres = {}
+    genres = set()
+    artist_ids = set()
+
+    with open(os.path.join(out_dir, "artists.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id:ID(Artist)", "name", "popularity:int", "followers:int", ":LABEL"])
+        for chunk in iter_chunks(os.path.join(data_dir, "artists.csv"), batch_size):
+            for r in chunk:
+                if not r.get("id") or r["id"] in artist_ids:
+                    continue
+                a = artist_row(r)
+                artist_ids.add(a["id"])
+                if a["genres"]:
+                    artist_genres[a["id"]] = a["genres"]
+                    genres.update(a["genres"])
+                w.writerow([a["id"], a["name"], a["popularity"], a["followers"], "Artist"])
+                total += 1
+
+    genres_path = os.path.join(data_dir, "genres.csv")
+    if os.path.exists(genres_path):
+        for chunk in iter_chunks(genres_path, batch_size):
+            genres.update(n for r in chunk if (n := (r.get("genres") or r.get("genre") or "").strip()))
+
+    with open(os.path.join(out_dir, "genres.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["name:ID(Genre)", "families:string[]", "family_mask:int", "family_taxonomy:long", ":LABEL"])
+        for g in sorted(genres):
+            w.writerow([g, ";".join(families_of(g)), genre_mask([g]), TAXONOMY_VERSION, "Genre"])
+            total += 1
+
+    with open(os.path.join(out_dir, "genre_families.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["name:ID(GenreFamily)", "bit:int", ":LABEL"])
+        for fam in FAMILIES:
+            w.writerow([fam, FAMILY_BITS[fam], "GenreFamily"])
+            total += 1
+
+    with open(os.path.join(out_dir, "in_family.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([":START_ID(Genre)", ":END_ID(GenreFamily)", ":TYPE"])
+        for g in sorted(genres):
+            for fam in families_of(g):
+                w.writerow([g, fam, "IN_FAMILY"])
+
+    track_ids = set()
+    with open(os.path.join(out_dir, "tracks.csv"), "w", newline="", encoding="utf-8") as ft, \
+         open(os.path.join(out_dir, "by_artist.csv"), "w", newline="", encoding="utf-8") as fa, \
+         open(os.path.join(out_dir, "has_genre.csv"), "w", newline="", encoding="utf-8") as fg:
+        wt, wa, wg = csv.writer(ft), csv.writer(fa), csv.writer(fg)
+        wt.writerow(["id:ID(Track)", "title", "popularity:int"] + [f"{x}:float" for x in AUDIO_FEATURES]
+                    + ["families:string[]", "family_mask:int", "family_taxonomy:long", ":LABEL"])
+        wa.writerow([":START_ID(Track)", ":END_ID(Artist)", ":TYPE"])
+        wg.writerow([":START_ID(Track)", ":END_ID(Genre)", ":TYPE"])
+        for chunk in iter_chunks(os.path.join(data_dir, "tracks.csv"), batch_size):
+            for r in chunk:
+                t = track_row(r, artist_genres)
+                if not t or t["id"] in track_ids or t["artist_id"] not in artist_ids:
+                    continue
+                track_ids.add(t["id"])
+                wt.writerow([t["id"], t["title"], t["popularity"]] + [t[x] for x in AUDIO_FEATURES]
+                            + [";".join(t["families"]), t["family_mask"], t["family_taxonomy"], "Track"])
+                wa.writerow([t["id"], t["artist_id"], "BY_ARTIST"])
+                for g in t["genres"]:
+                    wg.writerow([t["id"], g, "HAS_GENRE"])
+                total += 1
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Ficheros de import: {total} nodos en {elapsed:.1f}s ({total / elapsed:,.0f} filas/s)")
+    print(
+        f"neo4j-admin database import full {DB} "
+        f"--nodes={out_dir}/artists.csv --nodes={out_dir}/genres.csv --nodes={out_dir}/tracks.csv "
+        f"--nodes={out_dir}/genre_families.csv "
+        f"--relationships={out_dir}/by_artist.csv --relationships={out_dir}/has_genre.csv "
+        f"--relationships={out_dir}/in_family.csv"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el grafo de SpotifAI desde los CSV de data/.")
+    parser.add_argument("--data", default=DATA_DIR, help="carpeta con tracks.csv, artists.csv y genres.csv")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="lotes en paralelo por etiqueta")
+    parser.add_argument("--admin-import", metavar="OUT_DIR",
+                        help="en lugar de cargar, genera ficheros para neo4j-admin import")
+    parser.add_argument("--families", action="store_true",
+                        help="solo recalcula la taxonomía de géneros sobre el grafo existente")
+    args = parser.parse_args()
+
+    if args.admin_import:
+        write_admin_import(args.data, args.admin_import, args.batch_size)
+        return
+    if not ping():
+        raise SystemExit(f"No se puede conectar a Neo4j en {URI}")
+    if args.families:
+        init_schema()
+        build_genre_families(args.batch_size)
+        bump_catalog_version(driver, DB)
+        return
+    load_csv_dir(args.data, args.batch_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
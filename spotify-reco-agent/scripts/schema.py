@@ -0,0 +1,239 @@
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+
+load_dotenv()
+
+URI = os.getenv("NEO4J_URI", "bolt://127.0.0.1:7687")
+USER = os.getenv("NEO4J_USER", "neo4j")
+PASS = os.getenv("NEO4J_PASS", "testtest")
+DB   = os.getenv("NEO4J_DATABASE", "spotify")
+
+# distiluse-base-multilingual-cased-v2 genera vectores de 512 dimensiones
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+VECTOR_INDEX = "track_embedding_index"
+
+# ======================================================
+# Migraciones (versión guardada en el propio grafo)
+# ======================================================
+# Cada entrada es (versión, sentencias). Nunca modificar una versión ya aplicada:
+# añadir una nueva al final.
+MIGRATIONS = [
+    (1, [
+        "CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+        "CREATE CONSTRAINT track_id IF NOT EXISTS FOR (t:Track) REQUIRE t.id IS UNIQUE",
+        "CREATE CONSTRAINT artist_id IF NOT EXISTS FOR (a:Artist) REQUIRE a.id IS UNIQUE",
+    ]),
+    (2, [
+        "CREATE CONSTRAINT genre_name IF NOT EXISTS FOR (g:Genre) REQUIRE g.name IS UNIQUE",
+        "CREATE INDEX track_popularity IF NOT EXISTS FOR (t:Track) ON (t.popularity)",
+        # índice de Artist.name para artist_exists (búsqueda por palabras, sin mayúsculas)
+        "CREATE FULLTEXT INDEX artist_name_fulltext IF NOT EXISTS FOR (a:Artist) ON EACH [a.name]",
+        f"""
+        CREATE VECTOR INDEX {VECTOR_INDEX} IF NOT EXISTS
+        FOR (t:Track) ON (t.embedding)
+        OPTIONS {{indexConfig: {{
+            `vector.dimensions`: {EMBEDDING_DIM},
+            `vector.similarity_function`: 'cosine'
+        }}}}
+        """,
+    ]),
+    (3, [
+        "CREATE CONSTRAINT genre_family_name IF NOT EXISTS FOR (f:GenreFamily) REQUIRE f.name IS UNIQUE",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def queries_to_check() -> dict[str, tuple[str, dict]]:
+    """
+    Consultas de app/neo4j_search.py (las mismas constantes que usa la app)
+    con parámetros de ejemplo, para revisar sus planes.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import neo4j_search as ns
+    from app.genres import TAXONOMY_VERSION
+
+    vec = [0.0] * EMBEDDING_DIM
+    return {
+        "search_similar_tracks": (ns.SEARCH_CYPHER, {
+            "vec": vec, "k": 50, "genre": "rock", "family": "rock", "taxonomy": TAXONOMY_VERSION,
+        }),
+        "search_by_vector/ids": (ns.SEARCH_IDS_CYPHER, {"vec": vec, "n": 100}),
+        "search_by_vector/hydrate": (ns.HYDRATE_CYPHER, {"ids": ["x"], "taxonomy": TAXONOMY_VERSION}),
+        "get_sample_tracks": (ns.SAMPLE_TRACKS_CYPHER, {"limit": 20}),
+        "save_preferences_batch": (
+            ns.SAVE_PREFERENCES_CYPHER, {"rows": [{"user_id": "usuario1", "id": "x", "rating": 3}]},
+        ),
+        "refresh_user_profiles": (ns.USER_PROFILE_CYPHER, {"user_ids": ["usuario1"]}),
+        "get_preference_tracks/profile": (ns.USER_DISLIKED_CYPHER, {"user_id": "usuario1"}),
+        "get_preference_tracks/disliked": (ns.DISLIKED_GENRES_CYPHER, {"user_id": "usuario1"}),
+        "get_preference_tracks/tracks": (
+            ns.PREFERENCE_TRACKS_CYPHER, {"disliked_genres": [], "skip": 0, "limit": 20},
+        ),
+        "artist_exists": (ns.ARTIST_EXISTS_CYPHER, {"query": '"coldplay"'}),
+    }
+
+
+SCAN_OPERATORS = ("NodeByLabelScan", "AllNodesScan")
+
+
+def get_schema_version(driver, db: str = DB) -> int:
+    with driver.session(database=db) as s:
+        rec = s.run("MATCH (m:SchemaMigration {id: 'spotifai'}) RETURN m.version AS version").single()
+    return rec["version"] if rec and rec["version"] is not None else 0
+
+
+def bump_catalog_version(driver, db: str = DB) -> int:
+    """
+    Sube la versión del catálogo que usa app/warmup.py para saber si sus
+    respuestas precalculadas siguen valiendo. La llaman graph.py y
+    embed_tracks.py al terminar; tras editar el grafo a mano: --bump-catalog.
+    """
+    with driver.session(database=db) as s:
+        rec = s.run(
+            "MERGE (c:CatalogVersion {id: 'spotifai'}) "
+            "SET c.version = coalesce(c.version, 0) + 1, c.updated_at = datetime() "
+            "RETURN c.version AS version"
+        ).single()
+    return rec["version"]
+
+
+def apply_schema(driver, db: str = DB) -> int:
+    """
+    Aplica las migraciones pendientes y devuelve la versión final del esquema.
+    Todas las sentencias usan IF NOT EXISTS, así que repetirlas es seguro.
+    """
+    current = get_schema_version(driver, db)
+    with driver.session(database=db) as s:
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            for q in statements:
+                s.run(q).consume()
+            s.run(
+                "MERGE (m:SchemaMigration {id: 'spotifai'}) SET m.version = $v, m.applied_at = datetime()",
+                v=version,
+            ).consume()
+            print(f"Esquema migrado a la versión {version}")
+            current = version
+    return current
+
+
+def wait_for_indexes(driver, db: str = DB, timeout: float = 600.0, poll: float = 2.0) -> list[dict]:
+    """
+    Espera a que todos los índices estén ONLINE. Devuelve los que no lo están
+    al agotar el tiempo (lista vacía si todo ha ido bien).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        with driver.session(database=db) as s:
+            indexes = s.run(
+                "SHOW INDEXES YIELD name, type, state, populationPercent "
+                "RETURN name, type, state, populationPercent"
+            ).data()
+        pending = [i for i in indexes if i["state"] != "ONLINE"]
+        failed = [i for i in pending if i["state"] == "FAILED"]
+        if not pending or failed or time.monotonic() >= deadline:
+            return pending
+        progress = ", ".join(f"{i['name']} {i['populationPercent'] or 0:.0f}%" for i in pending)
+        print(f"Esperando índices: {progress}")
+        time.sleep(poll)
+
+
+def check_vector_index(driver, db: str = DB) -> list[str]:
+    """
+    Comprueba que el índice vectorial existe con la dimensión y similitud esperadas.
+    """
+    with driver.session(database=db) as s:
+        rec = s.run(
+            "SHOW INDEXES YIELD name, options WHERE name = $name RETURN options",
+            name=VECTOR_INDEX,
+        ).single()
+    if not rec:
+        return [f"falta el índice {VECTOR_INDEX}"]
+
+    config = (rec["options"] or {}).get("indexConfig", {})
+    problems = []
+    dims = config.get("vector.dimensions")
+    if dims != EMBEDDING_DIM:
+        problems.append(f"{VECTOR_INDEX}: dimensión {dims}, se esperaba {EMBEDDING_DIM}")
+    sim = str(config.get("vector.similarity_function", "")).lower()
+    if sim != "cosine":
+        problems.append(f"{VECTOR_INDEX}: similitud {sim or '?'}, se esperaba cosine")
+    return problems
+
+
+def find_scans(plan: dict, found: list[str] | None = None) -> list[str]:
+    found = [] if found is None else found
+    if not plan:
+        return found
+    op = plan.get("operatorType", "")
+    if op.split("@")[0] in SCAN_OPERATORS:
+        details = (plan.get("args") or plan.get("arguments") or {}).get("Details", "")
+        found.append(f"{op.split('@')[0]} {details}".strip())
+    for child in plan.get("children") or []:
+        find_scans(child, found)
+    return found
+
+
+def check_query_plans(driver, db: str = DB) -> dict[str, list[str]]:
+    """
+    Hace EXPLAIN de cada consulta de la app y devuelve las que siguen
+    recorriendo etiquetas completas.
+    """
+    report = {}
+    with driver.session(database=db) as s:
+        for name, (q, params) in queries_to_check().items():
+            summary = s.run("EXPLAIN " + q, params).consume()
+            scans = find_scans(summary.plan)
+            if scans:
+                report[name] = scans
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea y verifica los índices del grafo de SpotifAI.")
+    parser.add_argument("--timeout", type=float, default=600.0, help="segundos máximos esperando índices ONLINE")
+    parser.add_argument("--no-wait", action="store_true", help="no esperar a que los índices estén ONLINE")
+    parser.add_argument("--bump-catalog", action="store_true",
+                        help="marca el catálogo como modificado para que la app recalcule sus cachés")
+    args = parser.parse_args()
+
+    driver = GraphDatabase.driver(URI, auth=(USER, PASS), encrypted=False)
+    try:
+        if args.bump_catalog:
+            print(f"Versión del catálogo: {bump_catalog_version(driver)}")
+
+        version = apply_schema(driver)
+        print(f"Versión del esquema: {version} (última: {SCHEMA_VERSION})")
+
+        ok = True
+        if not args.no_wait:
+            pending = wait_for_indexes(driver, timeout=args.timeout)
+            for i in pending:
+                ok = False
+                print(f"❌ Índice {i['name']} ({i['type']}) en estado {i['state']}")
+
+        for problem in check_vector_index(driver):
+            ok = False
+            print(f"❌ {problem}")
+
+        for name, scans in check_query_plans(driver).items():
+            for scan in scans:
+                print(f"⚠️  {name}: {scan}")
+
+    finally:
+        driver.close()
+
+    if not ok:
+        raise SystemExit(1)
+    print("✅ Índices creados y ONLINE.")
+
+
+if __name__ == "__main__":
+    main()
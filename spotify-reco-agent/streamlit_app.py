@@ -1,8 +1,15 @@
 # streamlit_app.py
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 
+from app import neo4j_search
 from app.agent import chat_with_agent
-from app.neo4j_search import get_preference_tracks, save_user_preferences
+from app.neo4j_search import get_preference_tracks
+from app.preferences import PreferenceWriter
+from app.warmup import EXAMPLE_PROMPTS, Warmup, load_hot_prompts
 
 # -------------------------------------------------
 # Configuración general
@@ -34,6 +41,91 @@ def render_agent_response(respuesta: str):
         st.markdown(respuesta)
 
 
+# -------------------------------------------------
+# Recursos compartidos (una vez por proceso, no por rerun)
+# -------------------------------------------------
+PREF_BLOCK_SIZE = 20
+MAX_CACHED_BLOCKS = 200
+
+
+@st.cache_resource
+def get_preference_cache():
+    """
+    Bloques de preferencias por (user_id, versión, página). La versión de cada
+    usuario sube al guardar, así que los bloques viejos dejan de usarse.
+    """
+    return {
+        "lock": threading.Lock(),
+        "pool": ThreadPoolExecutor(max_workers=2, thread_name_prefix="pref-prefetch"),
+        "versions": {},
+        "blocks": {},
+    }
+
+
+def _preference_future(cache: dict, user_id: str, page: int):
+    with cache["lock"]:
+        key = (user_id, cache["versions"].get(user_id, 0), page)
+        fut = cache["blocks"].get(key)
+        if fut is None or (fut.done() and fut.exception() is not None):
+            fut = cache["pool"].submit(
+                get_preference_tracks, user_id=user_id, limit=PREF_BLOCK_SIZE, page=page
+            )
+            cache["blocks"][key] = fut
+            while len(cache["blocks"]) > MAX_CACHED_BLOCKS:
+                cache["blocks"].pop(next(iter(cache["blocks"])))
+        return fut
+
+
+def load_preference_block(user_id: str, page: int) -> list[dict]:
+    """
+    Devuelve el bloque `page` (cacheado) y deja el siguiente cargándose en
+    segundo plano para que "Cambiar canciones" sea inmediato.
+    """
+    cache = get_preference_cache()
+    tracks = _preference_future(cache, user_id, page).result()
+    if tracks:
+        _preference_future(cache, user_id, page + 1)
+    return tracks
+
+
+def invalidate_preference_blocks(user_id: str, cache: dict | None = None):
+    cache = cache or get_preference_cache()
+    with cache["lock"]:
+        cache["versions"][user_id] = cache["versions"].get(user_id, 0) + 1
+        for key in [k for k in cache["blocks"] if k[0] == user_id]:
+            del cache["blocks"][key]
+
+
+@st.cache_resource
+def get_preference_writer():
+    """
+    Cola de escritura de valoraciones: el botón de guardar vuelve enseguida y
+    los bloques del usuario se invalidan cuando la escritura ha terminado.
+    """
+    cache = get_preference_cache()
+    writer = PreferenceWriter(on_saved=lambda user_id: invalidate_preference_blocks(user_id, cache)).start()
+    atexit.register(writer.stop)
+    return writer
+
+
+@st.cache_resource
+def get_warmup():
+    """
+    Precalcula en segundo plano las respuestas de los ejemplos del sidebar
+    y de SPOTIFAI_HOT_PROMPTS, y las refresca si cambia el catálogo o el modelo.
+    """
+    return Warmup(EXAMPLE_PROMPTS + load_hot_prompts()).start()
+
+
+# El driver y el cliente de Ollama ya son globales de sus módulos; el modelo
+# de embeddings también, pero se carga la primera vez que se usa: hacerlo aquí
+# para que el spinner solo aparezca en el primer arranque del proceso.
+if neo4j_search.embed_model is None:
+    with st.spinner("Cargando modelo de embeddings..."):
+        neo4j_search.get_embed_model()
+get_warmup()
+
+
 # -------------------------------------------------
 # Estado inicial
 # -------------------------------------------------
@@ -80,13 +172,7 @@ st.session_state.user_id = st.sidebar.text_input(
 st.sidebar.markdown("---")
 st.sidebar.header("💡 Ejemplos de preguntas")
 
-example_prompts = [
-    "Quiero música tranquila para relajarme después de un día largo",
-    "Dame 5 canciones pop muy conocidas",
-    "Me gusta Coldplay y Keane, recomiéndame algo parecido",
-    "Quiero música para estudiar sin distraerme",
-    "Basándote en mis gustos, sorpréndeme",
-]
+example_prompts = EXAMPLE_PROMPTS
 
 for p in example_prompts:
     if st.sidebar.button(p):
@@ -197,6 +283,14 @@ else:
         "(0 = nada, 5 = me encanta)."
     )
 
+    writer = get_preference_writer()
+    save_error = writer.error(st.session_state.user_id)
+    pending = writer.pending(st.session_state.user_id)
+    if save_error:
+        st.error(f"No se han podido guardar tus valoraciones, se reintentará ({save_error}).")
+    elif pending:
+        st.info(f"Guardando {pending} valoraciones en segundo plano...")
+
     colA, colB = st.columns([3, 1])
     with colA:
         st.markdown(f"### Bloque #{st.session_state.pref_page + 1}")
@@ -205,10 +299,9 @@ else:
             st.session_state.pref_page += 1
             st.rerun()
 
-    tracks = get_preference_tracks(
-        user_id=st.session_state.user_id,
-        limit=20,
-        page=st.session_state.pref_page,
+    tracks = load_preference_block(
+        st.session_state.user_id,
+        st.session_state.pref_page,
     )
 
     ratings = {}
@@ -241,5 +334,8 @@ else:
         if not ratings:
             st.warning("No has puntuado ninguna canción.")
         else:
-            save_user_preferences(st.session_state.user_id, ratings)
-            st.success(f"Preferencias guardadas ({len(ratings)} canciones).")
+            writer.submit(st.session_state.user_id, ratings)
+            st.info(
+                f"{len(ratings)} valoraciones en cola; se guardarán en unos instantes. "
+                "Si falla la escritura, lo verás al volver a esta página."
+            )